@@ -1,9 +1,11 @@
 #!/usr/bin/env python
 
+import os
 import sys
 import json
+import time
+import socket
 import argparse
-from pprint import pformat
 
 import jmespath
 from jmespath import exceptions
@@ -11,43 +13,697 @@ from jmespath import exceptions
 
 def main():
     parser = argparse.ArgumentParser()
-    parser.add_argument('expression')
-    parser.add_argument('-f', '--filename',
+    parser.add_argument('expression', nargs='?')
+    parser.add_argument('-e', '--expr', dest='expressions', action='append',
+                        default=[], metavar='EXPRESSION',
+                        help=('An expression to evaluate.  Can be specified '
+                              'multiple times to evaluate several '
+                              'expressions against the same input, which is '
+                              'only read and parsed once.'))
+    parser.add_argument('--expressions-file',
+                        help=('A file containing expressions to evaluate, '
+                              'one per line.  Blank lines and lines '
+                              'starting with # are ignored.'))
+    parser.add_argument('--lines', action='store_true',
+                        help=('When evaluating multiple expressions, output '
+                              'each result as a line of compact JSON, in '
+                              'the order of the expressions, instead of a '
+                              'JSON object keyed by expression.'))
+    parser.add_argument('-f', '--filename', action='append', default=[],
                         help=('The filename containing the input data.  '
                               'If a filename is not given then data is '
-                              'read from stdin.'))
+                              'read from stdin.  Can be specified multiple '
+                              'times and can be a glob pattern, in which '
+                              'case each file is searched separately and '
+                              'each result is output as a line of JSON, '
+                              '{"file": ..., "result": ...}.'))
+    parser.add_argument('-j', '--jobs', type=int,
+                        default=os.cpu_count() or 1,
+                        help=('The number of processes searching files in '
+                              'parallel when there are multiple files.'))
+    parser.add_argument('--ordered', action='store_true',
+                        help=('With multiple files, output the results in '
+                              'the order of the files instead of as soon '
+                              'as they are available.'))
     parser.add_argument('--ast', action='store_true',
                         help=('Pretty print the AST, do not search the data.'))
+    parser.add_argument('--serve', metavar='SOCKET',
+                        help=('Run as a daemon that evaluates the requests '
+                              'of jp.py --connect, listening on this unix '
+                              'socket.  Compiled expressions stay cached '
+                              'between requests.'))
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1,
+                        help=('The number of worker processes handling '
+                              'requests in parallel with --serve.'))
+    parser.add_argument('--connect', metavar='SOCKET',
+                        help=('Send the expressions and the input data to '
+                              'the jp.py --serve daemon listening on this '
+                              'unix socket, instead of evaluating them in '
+                              'this process.'))
+    parser.add_argument('--indent', type=int, default=4,
+                        help=('The number of spaces to indent the JSON '
+                              'output with.'))
+    parser.add_argument('-c', '--compact', action='store_true',
+                        help=('Output compact JSON, without any '
+                              'whitespace.'))
+    parser.add_argument('--benchmark', type=int, metavar='N',
+                        help=('Instead of outputting the result, search the '
+                              'input N times and report the time spent '
+                              'loading the JSON input, compiling the '
+                              'expression and searching, and the size of '
+                              'the result.'))
+    parser.add_argument('--profile', action='store_true',
+                        help=('Instead of outputting the result, report the '
+                              'time spent in each node of the expression.  '
+                              'Can be combined with --benchmark.'))
     args = parser.parse_args()
-    expression = args.expression
+    indent = None if args.compact else args.indent
+    if args.serve:
+        return _serve(args.serve, args.workers)
+    expressions = _collect_expressions(args)
+    if not expressions:
+        parser.error('An expression is required, either as an argument, '
+                     'with -e, or with --expressions-file.')
+    single = len(expressions) == 1 and args.expression is not None
+    multiple_files = (len(args.filename) > 1 or
+                      any(_has_magic(name) for name in args.filename))
+    if args.benchmark is not None or args.profile:
+        if args.benchmark is not None and args.benchmark < 1:
+            parser.error('--benchmark requires at least one run.')
+        if multiple_files or args.connect:
+            parser.error('--benchmark and --profile only support a single '
+                         'input file, without --connect.')
+    if args.connect:
+        if multiple_files:
+            parser.error('--connect only supports a single input file.')
+        return _connect(args.connect, expressions, single, args.lines,
+                        indent, args.filename[0] if args.filename else None)
     if args.ast:
         # Only print the AST
-        expression = jmespath.compile(args.expression)
-        sys.stdout.write(pformat(expression.parsed))
-        sys.stdout.write('\n')
+        from pprint import pformat
+        for expression in expressions:
+            expression = jmespath.compile(expression)
+            sys.stdout.write(pformat(expression.parsed))
+            sys.stdout.write('\n')
         return 0
+    if multiple_files:
+        return _search_files(args.filename, expressions, single,
+                             args.jobs, args.ordered)
+    if args.benchmark is not None or args.profile:
+        return _benchmark(expressions, args.filename[0] if args.filename
+                          else None, args.benchmark, args.profile)
     if args.filename:
-        with open(args.filename, 'r') as f:
+        with open(args.filename[0], 'r') as f:
             data = json.load(f)
     else:
         data = sys.stdin.read()
         data = json.loads(data)
     try:
-        sys.stdout.write(json.dumps(
-            jmespath.search(expression, data), indent=4, ensure_ascii=False))
-        sys.stdout.write('\n')
-    except exceptions.ArityError as e:
-        sys.stderr.write("invalid-arity: %s\n" % e)
+        _evaluate(expressions, data, single, args.lines, sys.stdout,
+                  indent)
+    except exceptions.JMESPathError as e:
+        message = _error_message(e)
+        if message is None:
+            raise
+        sys.stderr.write(message)
         return 1
-    except exceptions.JMESPathTypeError as e:
-        sys.stderr.write("invalid-type: %s\n" % e)
-        return 1
-    except exceptions.UnknownFunctionError as e:
-        sys.stderr.write("unknown-function: %s\n" % e)
-        return 1
-    except exceptions.ParseError as e:
-        sys.stderr.write("syntax-error: %s\n" % e)
+
+
+def _has_magic(pattern):
+    # The same as glob.has_magic(), without importing glob.  The
+    # modules only needed by some modes are imported by those modes,
+    # so --connect starts as fast as possible.
+    return any(c in pattern for c in '*?[')
+
+
+def _error_message(e):
+    if isinstance(e, exceptions.ArityError):
+        return "invalid-arity: %s\n" % e
+    elif isinstance(e, exceptions.JMESPathTypeError):
+        return "invalid-type: %s\n" % e
+    elif isinstance(e, exceptions.UnknownFunctionError):
+        return "unknown-function: %s\n" % e
+    elif isinstance(e, exceptions.ParseError):
+        return "syntax-error: %s\n" % e
+    elif isinstance(e, exceptions.UndefinedVariableError):
+        return "undefined-variable: %s\n" % e
+    return None
+
+
+def _evaluate(expressions, data, single, lines, out, indent=4):
+    if single:
+        _write_json(jmespath.search(expressions[0], data), out, indent)
+    else:
+        _search_multiple(expressions, data, lines, out, indent)
+
+
+# The output is written in chunks of about this many characters.
+_CHUNK_SIZE = 64 * 1024
+# Compact JSON values with fewer nested elements than this are encoded
+# in one go, see _iterencode().
+_ONE_SHOT_ELEMENTS = 16 * 1024
+
+
+def _write_json(value, out, indent):
+    # Serializes ``value`` incrementally instead of building the whole
+    # string first, so the output starts as soon as possible and peak
+    # memory isn't doubled for large results.  ``indent=None`` writes
+    # compact JSON.
+    if indent is None:
+        encoder = json.JSONEncoder(separators=(',', ':'),
+                                   ensure_ascii=False)
+    else:
+        encoder = json.JSONEncoder(indent=indent, ensure_ascii=False)
+    if hasattr(out, 'buffer'):
+        # Bypass the text layer of sys.stdout.
+        out.flush()
+        buffer = out.buffer
+
+        def write(text):
+            buffer.write(text.encode('utf-8'))
+    else:
+        write = out.write
+    if indent is not None and sys.version_info < (3, 13):
+        # The C encoder only supports indentation since python 3.13.
+        parts = encoder.iterencode(value)
+    else:
+        parts = _iterencode(encoder, value)
+    chunk = []
+    size = 0
+    for part in parts:
+        chunk.append(part)
+        size += len(part)
+        if size >= _CHUNK_SIZE:
+            write(''.join(chunk))
+            chunk = []
+            size = 0
+    chunk.append('\n')
+    write(''.join(chunk))
+    if hasattr(out, 'buffer'):
+        out.buffer.flush()
+
+
+def _iterencode(encoder, value, level=0):
+    # JSONEncoder.iterencode() never uses the C encoder, which is two
+    # to three times as fast as the pure python one, only encode()
+    # does.  So values with fewer than _ONE_SHOT_ELEMENTS nested
+    # elements are encoded with encode(), and only larger arrays and
+    # objects are streamed, in batches of elements that are small
+    # enough.  ``level`` is the nesting level of ``value``.
+    if (not isinstance(value, (list, dict)) or
+            _count_elements(value, _ONE_SHOT_ELEMENTS) < _ONE_SHOT_ELEMENTS):
+        yield _reindent(encoder, encoder.encode(value), level)
+    elif isinstance(value, list):
+        yield '['
+        separator = ''
+        batch = []
+        count = 0
+        for element in value:
+            size = 1
+            if isinstance(element, (list, dict)):
+                size += _count_elements(element, _ONE_SHOT_ELEMENTS)
+            if batch and count + size >= _ONE_SHOT_ELEMENTS:
+                yield separator + _encode_elements(encoder, batch, level)
+                separator = encoder.item_separator
+                batch = []
+                count = 0
+            if size >= _ONE_SHOT_ELEMENTS:
+                yield separator + _newline(encoder, level + 1)
+                separator = encoder.item_separator
+                for part in _iterencode(encoder, element, level + 1):
+                    yield part
+            else:
+                batch.append(element)
+                count += size
+        if batch:
+            yield separator + _encode_elements(encoder, batch, level)
+        yield _newline(encoder, level) + ']'
+    elif not all(isinstance(key, str) for key in value):
+        # Let the encoder convert (or reject) keys that aren't strings.
+        yield _reindent(encoder, encoder.encode(value), level)
+    else:
+        yield '{'
+        separator = ''
+        for key, element in value.items():
+            yield (separator + _newline(encoder, level + 1) +
+                   encoder.encode(key) + encoder.key_separator)
+            separator = encoder.item_separator
+            for part in _iterencode(encoder, element, level + 1):
+                yield part
+        yield _newline(encoder, level) + '}'
+
+
+def _encode_elements(encoder, elements, level):
+    # The encoded elements of an array at ``level``, without its
+    # brackets (and the line break before the closing bracket).
+    encoded = encoder.encode(elements)[1:-1]
+    if encoder.indent is not None:
+        encoded = _reindent(encoder, encoded[:-1], level)
+    return encoded
+
+
+def _reindent(encoder, encoded, level):
+    # Indents a value encoded at level 0 to ``level``.  The encoded
+    # strings can't contain line breaks, they're always escaped.
+    if encoder.indent is None or not level:
+        return encoded
+    return encoded.replace('\n', _newline(encoder, level))
+
+
+def _newline(encoder, level):
+    # The line break before a value at ``level``.
+    if encoder.indent is None:
+        return ''
+    return '\n' + ' ' * (encoder.indent * level)
+
+
+def _count_elements(value, limit):
+    # The number of nested array elements and object values in
+    # ``value``, counting stops once ``limit`` is reached.
+    count = 0
+    stack = [value]
+    while stack and count < limit:
+        value = stack.pop()
+        count += len(value)
+        if isinstance(value, dict):
+            value = value.values()
+        for element in value:
+            if isinstance(element, (list, dict)):
+                stack.append(element)
+    return count
+
+
+def _benchmark(expressions, filename, iterations, profile):
+    out = sys.stdout
+    if filename:
+        with open(filename, 'rb') as f:
+            raw = f.read()
+    else:
+        raw = sys.stdin.buffer.read()
+    start = time.perf_counter()
+    data = json.loads(raw)
+    out.write('input: %s bytes, JSON load: %s\n' % (
+        len(raw), _format_seconds(time.perf_counter() - start)))
+    status = 0
+    for expression in expressions:
+        out.write('\nexpression: %s\n' % expression)
+        try:
+            if iterations:
+                _benchmark_expression(expression, data, iterations, out)
+            if profile:
+                _write_profile(jmespath.compile(expression).profile(data),
+                               out)
+        except exceptions.JMESPathError as e:
+            message = _error_message(e)
+            if message is None:
+                raise
+            sys.stderr.write(message)
+            status = 1
+    return status
+
+
+def _benchmark_expression(expression, data, iterations, out):
+    import statistics
+    options = jmespath.Options()
+    jmespath.parser.Parser.purge()
+    start = time.perf_counter()
+    parsed = jmespath.compile(expression, options)
+    cold = time.perf_counter() - start
+    cached = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        jmespath.compile(expression, options)
+        cached.append(time.perf_counter() - start)
+    out.write('compile: cold %s, cached %s (median)\n' % (
+        _format_seconds(cold), _format_seconds(statistics.median(cached))))
+    times = []
+    for _ in range(iterations):
+        start = time.perf_counter()
+        result = parsed.search(data, options)
+        times.append(time.perf_counter() - start)
+    times.sort()
+    out.write('search (%s runs): min %s, median %s, mean %s, p95 %s, '
+              'p99 %s, max %s, stddev %s\n' % (
+                  iterations, _format_seconds(times[0]),
+                  _format_seconds(statistics.median(times)),
+                  _format_seconds(statistics.mean(times)),
+                  _format_seconds(_percentile(times, 0.95)),
+                  _format_seconds(_percentile(times, 0.99)),
+                  _format_seconds(times[-1]),
+                  _format_seconds(statistics.stdev(times)
+                                  if len(times) > 1 else 0.0)))
+    encoded = json.dumps(result, separators=(',', ':'), ensure_ascii=False)
+    if isinstance(result, (list, dict)):
+        elements = '%s elements, ' % len(result)
+    else:
+        elements = ''
+    out.write('result: %s%s bytes of compact JSON\n' % (
+        elements, len(encoded.encode('utf-8'))))
+
+
+def _write_profile(profile, out, hotspots=5):
+    out.write('profile (%s):\n%s\n' % (
+        _format_seconds(profile.total_time), profile.render_tree()))
+    slowest = sorted((stats for _, stats in profile.nodes),
+                     key=lambda stats: stats.self_time, reverse=True)
+    out.write('hotspots (self time):\n')
+    for stats in slowest[:hotspots]:
+        share = 0.0
+        if profile.total_time:
+            share = 100.0 * stats.self_time / profile.total_time
+        out.write('  %5.1f%% %s %s(%s), %s visits\n' % (
+            share, _format_seconds(stats.self_time), stats.node['type'],
+            '' if stats.node.get('value') is None else stats.node['value'],
+            stats.visits))
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(fraction * len(ordered)), len(ordered) - 1)]
+
+
+def _format_seconds(seconds):
+    if seconds >= 1:
+        return '%.3fs' % seconds
+    elif seconds >= 0.001:
+        return '%.3fms' % (seconds * 1000)
+    return '%.3fus' % (seconds * 1000000)
+
+
+def _collect_expressions(args):
+    expressions = []
+    if args.expression is not None:
+        expressions.append(args.expression)
+    expressions.extend(args.expressions)
+    if args.expressions_file:
+        with open(args.expressions_file, 'r') as f:
+            for line in f:
+                line = line.strip()
+                if line and not line.startswith('#'):
+                    expressions.append(line)
+    return expressions
+
+
+def _search_multiple(expressions, data, lines, out, indent=4):
+    # Every expression is compiled before any of them is evaluated,
+    # so an invalid expression is reported before any output.
+    options = jmespath.Options()
+    compiled = [jmespath.compile(expression, options)
+                for expression in expressions]
+    if lines:
+        for parsed in compiled:
+            out.write(json.dumps(parsed.search(data, options),
+                                 separators=(',', ':'), ensure_ascii=False))
+            out.write('\n')
+    else:
+        results = {}
+        for parsed in compiled:
+            results[parsed.expression] = parsed.search(data, options)
+        _write_json(results, out, indent)
+
+
+def _search_files(patterns, expressions, single, jobs, ordered):
+    import glob
+    from concurrent import futures
+    status = 0
+    filenames = []
+    for pattern in patterns:
+        if glob.has_magic(pattern):
+            matched = sorted(glob.glob(pattern))
+            if not matched:
+                sys.stderr.write("jp.py: no files match %s\n" % pattern)
+                status = 1
+            filenames.extend(matched)
+        else:
+            filenames.append(pattern)
+    # Invalid expressions are reported once, before searching any file.
+    try:
+        options = jmespath.Options()
+        compiled = [jmespath.compile(expression, options)
+                    for expression in expressions]
+    except exceptions.JMESPathError as e:
+        message = _error_message(e)
+        if message is None:
+            raise
+        sys.stderr.write(message)
         return 1
+    if jobs <= 1:
+        _init_file_worker(compiled, single)
+        results = map(_search_file, filenames)
+    else:
+        executor = futures.ProcessPoolExecutor(
+            jobs, initializer=_init_file_worker,
+            initargs=(compiled, single))
+        # At most ``window`` files are being searched or waiting to be
+        # output, which bounds the memory used by the results.
+        results = _bounded_map(executor, _search_file, filenames,
+                               window=jobs * 2, ordered=ordered)
+    try:
+        for line, failed in results:
+            sys.stdout.write(line)
+            if failed:
+                status = 1
+    finally:
+        if jobs > 1:
+            # Closing the generator cancels the searches that haven't
+            # started yet.  shutdown(cancel_futures=True) would do the
+            # same, but requires python 3.9.
+            results.close()
+            executor.shutdown()
+    return status
+
+
+def _bounded_map(executor, func, items, window, ordered):
+    import collections
+    import itertools
+    from concurrent import futures
+    items = iter(items)
+    pending = collections.deque(
+        executor.submit(func, item)
+        for item in itertools.islice(items, window))
+    try:
+        while pending:
+            if ordered:
+                done = [pending.popleft()]
+            else:
+                finished, _ = futures.wait(
+                    pending, return_when=futures.FIRST_COMPLETED)
+                done = [future for future in pending if future in finished]
+                for future in done:
+                    pending.remove(future)
+            for future in done:
+                yield future.result()
+                for item in itertools.islice(items, 1):
+                    pending.append(executor.submit(func, item))
+    finally:
+        for future in pending:
+            future.cancel()
+
+
+# The compiled expressions of the worker process, see
+# _init_file_worker().
+_file_worker = {}
+
+
+def _init_file_worker(compiled, single):
+    # The expressions are pickled without their compiled ASTs, so
+    # they're compiled again here instead of on the first search.
+    options = jmespath.Options()
+    _file_worker['compiled'] = [parsed.bind(options) for parsed in compiled]
+    _file_worker['single'] = single
+
+
+def _search_file(filename):
+    # Returns a tuple of (line of output, whether the search failed).
+    compiled = _file_worker['compiled']
+    tagged = {'file': filename}
+    try:
+        with open(filename, 'r') as f:
+            data = json.load(f)
+        if _file_worker['single']:
+            tagged['result'] = compiled[0].search(data)
+        else:
+            tagged['result'] = dict((parsed.expression, parsed.search(data))
+                                    for parsed in compiled)
+    except exceptions.JMESPathError as e:
+        message = _error_message(e) or "%s: %s\n" % (type(e).__name__, e)
+        tagged['error'] = message.rstrip('\n')
+    except (OSError, ValueError) as e:
+        tagged['error'] = "%s: %s" % (type(e).__name__, e)
+    return (json.dumps(tagged, separators=(',', ':'), ensure_ascii=False) +
+            '\n', 'error' in tagged)
+
+
+# The protocol between --connect and --serve: the client sends a line
+# with a JSON header, {"expressions": [...], "single": bool, "lines":
+# bool, "indent": int or null}, followed by the input data, and then
+# shuts down its side of the connection.  The server streams the output
+# back in chunks, each one a line with its length in bytes followed by
+# the bytes of the chunk, ending with an empty chunk.  That's followed
+# by a line with a JSON trailer, {"status": exit code, "error":
+# message}, so an error that happens after part of the output has been
+# sent can still be reported.
+
+def _serve(socket_path, workers):
+    import signal
+    import socketserver
+
+    class RequestHandler(socketserver.StreamRequestHandler):
+        def handle(self):
+            _handle_request(self.rfile, self.wfile)
+
+    if os.path.exists(socket_path):
+        _remove_stale_socket(socket_path)
+    server = socketserver.UnixStreamServer(socket_path, RequestHandler)
+    os.chmod(socket_path, 0o600)
+    # Every worker accepts connections on the same socket, and keeps
+    # its own cache of compiled expressions.
+    children = []
+    for _ in range(max(workers, 1)):
+        pid = os.fork()
+        if pid == 0:
+            signal.signal(signal.SIGTERM, signal.SIG_DFL)
+            try:
+                server.serve_forever()
+            except KeyboardInterrupt:
+                pass
+            finally:
+                os._exit(0)
+        children.append(pid)
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))
+    try:
+        for pid in children:
+            os.waitpid(pid, 0)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        for pid in children:
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except OSError:
+                pass
+        server.server_close()
+        os.unlink(socket_path)
+    return 0
+
+
+def _remove_stale_socket(socket_path):
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(socket_path)
+    except ConnectionRefusedError:
+        # Left behind by a daemon that didn't exit cleanly.
+        os.unlink(socket_path)
+    else:
+        raise SystemExit("jp.py: %s is already in use" % socket_path)
+    finally:
+        sock.close()
+
+
+def _handle_request(rfile, wfile):
+    out = _ChunkWriter(wfile)
+    try:
+        header = json.loads(rfile.readline().decode('utf-8'))
+        data = json.loads(rfile.read().decode('utf-8'))
+        _evaluate(header['expressions'], data, header['single'],
+                  header['lines'], out, header['indent'])
+        out.close()
+    except OSError:
+        # The client went away, there's no one to report to.
+        raise
+    except Exception as e:
+        # Any JMESPathError, invalid JSON input, or an unexpected
+        # error such as a RecursionError for a deeply nested
+        # expression.  This worker keeps serving requests.
+        message = None
+        if isinstance(e, exceptions.JMESPathError):
+            message = _error_message(e)
+        if message is None:
+            message = "%s: %s\n" % (type(e).__name__, e)
+        out.close()
+        trailer = {'status': 1, 'error': message}
+    else:
+        trailer = {'status': 0}
+    wfile.write(json.dumps(trailer).encode('utf-8') + b'\n')
+
+
+class _ChunkWriter(object):
+    # A text stream that sends what's written to it as the chunks of a
+    # --serve response, once at least _CHUNK_SIZE characters have been
+    # written.
+    def __init__(self, wfile):
+        self._wfile = wfile
+        self._pending = []
+        self._size = 0
+        self._closed = False
+
+    def write(self, text):
+        self._pending.append(text)
+        self._size += len(text)
+        if self._size >= _CHUNK_SIZE:
+            self._send_pending()
+
+    def close(self):
+        # Sends what's left, followed by the empty chunk that ends
+        # the output.
+        if not self._closed:
+            self._closed = True
+            self._send_pending()
+            self._wfile.write(b'0\n')
+
+    def _send_pending(self):
+        data = ''.join(self._pending).encode('utf-8')
+        self._pending = []
+        self._size = 0
+        if data:
+            self._wfile.write(b'%d\n' % len(data) + data)
+
+
+def _connect(socket_path, expressions, single, lines, indent, filename):
+    import shutil
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    sock.connect(socket_path)
+    with sock:
+        header = {'expressions': expressions, 'single': single,
+                  'lines': lines, 'indent': indent}
+        sock.sendall(json.dumps(header).encode('utf-8') + b'\n')
+        with sock.makefile('wb') as request:
+            if filename:
+                with open(filename, 'rb') as f:
+                    shutil.copyfileobj(f, request)
+            else:
+                shutil.copyfileobj(sys.stdin.buffer, request)
+        sock.shutdown(socket.SHUT_WR)
+        with sock.makefile('rb') as response:
+            return _read_response(response)
+
+
+def _read_response(response):
+    while True:
+        line = response.readline()
+        if not line.rstrip(b'\n').isdigit():
+            return _no_response()
+        size = int(line)
+        if not size:
+            break
+        chunk = response.read(size)
+        if len(chunk) != size:
+            return _no_response()
+        sys.stdout.buffer.write(chunk)
+    sys.stdout.buffer.flush()
+    line = response.readline()
+    if not line:
+        return _no_response()
+    trailer = json.loads(line.decode('utf-8'))
+    if trailer['status']:
+        sys.stderr.write(trailer['error'])
+    return trailer['status']
+
+
+def _no_response():
+    # The daemon's worker died before it finished its response.
+    sys.stdout.buffer.flush()
+    sys.stderr.write("jp.py: incomplete response from the daemon\n")
+    return 1
 
 
 if __name__ == '__main__':
@@ -1,12 +1,53 @@
-from jmespath import parser
-from jmespath.visitor import Options
-
 __version__ = '1.0.1'
 
 
-def compile(expression):
-    return parser.Parser().parse(expression)
+# The modules and attributes below are only imported when they're
+# first used (PEP 562), so ``import jmespath`` itself is fast.
+_LAZY_ATTRIBUTES = {
+    'Options': ('jmespath.visitor', 'Options'),
+}
+_LAZY_MODULES = frozenset([
+    'ast', 'compiler', 'exceptions', 'functions', 'graphviz', 'lexer',
+    'metrics', 'parser', 'profiler', 'visitor',
+])
+
+
+def __getattr__(name):
+    # __import__() is used instead of importlib so these imports are
+    # reported by ``python -X importtime``.
+    if name in _LAZY_ATTRIBUTES:
+        module_name, attribute = _LAZY_ATTRIBUTES[name]
+        value = getattr(__import__(module_name, fromlist=[attribute]),
+                        attribute)
+        globals()[name] = value
+        return value
+    elif name in _LAZY_MODULES:
+        # Importing a submodule binds it in this module's globals.
+        __import__('jmespath.%s' % name)
+        return globals()[name]
+    raise AttributeError(
+        "module %r has no attribute %r" % (__name__, name))
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_LAZY_ATTRIBUTES) | _LAZY_MODULES)
+
+
+def compile(expression, options=None):
+    from jmespath import parser
+    parsed = parser.Parser().parse(expression)
+    if options is not None:
+        parsed.bind(options)
+    return parsed
+
+
+def prepare(expression):
+    from jmespath import parser
+    parsed = parser.Parser().parse(expression)
+    return parser.PreparedExpression(parsed.expression, parsed.parsed)
 
 
-def search(expression, data, options=None):
-    return parser.Parser().parse(expression).search(data, options=options)
+def search(expression, data, options=None, params=None):
+    from jmespath import parser
+    return parser.Parser().parse(expression).search(data, options=options,
+                                                    params=params)
@@ -46,6 +46,10 @@ def key_val_pair(key_name, node):
     return {"type": "key_val_pair", 'children': [node], "value": key_name}
 
 
+def let_expression(bindings, expression):
+    return {'type': 'let_expression', 'children': bindings + [expression]}
+
+
 def literal(literal_value):
     return {'type': 'literal', 'value': literal_value, 'children': []}
 
@@ -88,3 +92,12 @@ def slice(start, end, step):
 
 def value_projection(left, right):
     return {'type': 'value_projection', 'children': [left, right]}
+
+
+def variable_binding(name, expression):
+    return {'type': 'variable_binding', 'children': [expression],
+            'value': name}
+
+
+def variable_ref(name):
+    return {'type': 'variable_ref', 'children': [], 'value': name}
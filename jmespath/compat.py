@@ -1,5 +1,5 @@
 import sys
-import inspect
+import types
 from itertools import zip_longest
 
 
@@ -15,5 +15,11 @@ def with_repr_method(cls):
     return cls
 
 def get_methods(cls):
-    for name, method in inspect.getmembers(cls, predicate=inspect.isfunction):
-        yield name, method
+    # Equivalent to inspect.getmembers(cls, predicate=inspect.isfunction),
+    # without importing inspect, which is slow to import.
+    members = {}
+    for klass in reversed(cls.__mro__):
+        members.update(vars(klass))
+    for name in sorted(members):
+        if isinstance(members[name], types.FunctionType):
+            yield name, members[name]
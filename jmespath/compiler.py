@@ -0,0 +1,363 @@
+"""Compile a parsed AST against a set of functions.
+
+The AST produced by the parser does not depend on which functions
+are available, the same parsed expression can be searched with the
+built-in functions or with any ``Functions`` subclass provided
+through ``Options.custom_functions``.  The ``Compiler`` takes a
+parsed AST and a ``Functions`` instance and produces a new AST where
+every function call has been resolved to the callable and argument
+validator it will use.  Doing this once means that:
+
+* Unknown functions and arity errors are raised when the expression
+  is compiled instead of when the function is first evaluated.
+* The interpreter doesn't need to look up the function table on
+  every call.
+* Calls to pure functions (see ``jmespath.functions.signature``)
+  whose arguments are all literals, and whose result is a scalar,
+  are evaluated once and replaced by their result.
+* Sorting an array and only keeping its first elements, e.g.
+  ``sort_by(@, &foo)[:10]``, selects the elements with a heap instead
+  of sorting the whole array.
+* Expressions that are evaluated for every element of a projection,
+  filter, or expref, but only depend on variables (e.g.
+  ``avg($items[*].price)``), are marked as hoisted.  They're evaluated
+  at most once for each scope that binds their variables.
+* Membership tests against a list of literals, i.e. ``contains()``
+  with a literal array and chains of ``a == 'x' || a == 'y'``, use a
+  precomputed frozenset instead of a linear scan.
+
+The compiled AST is an implementation detail, and is only meant
+to be evaluated by the ``TreeInterpreter``.  The original parsed
+AST is never modified.
+
+"""
+from jmespath import ast
+from jmespath import exceptions
+from jmespath import functions
+from jmespath.visitor import Visitor
+
+
+# Literal values that can be precomputed into a frozenset.
+_SCALAR_TYPES = (str, int, float, bool, type(None))
+
+
+class Compiler(Visitor):
+    def __init__(self, functions_instance):
+        super(Compiler, self).__init__()
+        self._functions = functions_instance
+        self._function_table = functions_instance.FUNCTION_TABLE
+        # If a subclass provides its own call_function() we can't
+        # bypass it, so function calls are left as is and are
+        # dispatched through call_function() at runtime.
+        self._can_bind = (type(functions_instance).call_function is
+                          functions.Functions.call_function)
+        self._hoisting = False
+        # id(node) -> (node, is invariant, references variables) for
+        # the compiled nodes analyzed by _hoist().  The node is kept
+        # so its id isn't reused.
+        self._analyzed = {}
+
+    def compile(self, node):
+        # Only expressions that reference variables have anything to
+        # hoist.
+        self._hoisting = _references_variables(node)
+        try:
+            return self.visit(node)
+        finally:
+            self._analyzed = {}
+
+    def default_visit(self, node):
+        compiled = node.copy()
+        compiled['children'] = [self.visit(child)
+                                for child in node['children']]
+        return compiled
+
+    def visit_slice(self, node):
+        # The children of a slice are the start/stop/step
+        # values, not AST nodes.
+        return node
+
+    def visit_function_expression(self, node):
+        children = [self.visit(child) for child in node['children']]
+        if not self._can_bind:
+            return {'type': 'function_expression', 'children': children,
+                    'value': node['value']}
+        spec = self._lookup_function(node['value'])
+        spec['arity_validator'](children)
+        if spec['pure'] and self._all_literals(children):
+            folded = self._fold_constant(spec, children)
+            if folded is not None:
+                return folded
+        if (spec['function'] is self._builtin_function('contains') and
+                self._is_scalar_array_literal(children[0])):
+            # contains() uses python's ``in``, and so does a frozenset
+            # so the results are identical.
+            return {'type': 'contains_literal', 'children': [children[1]],
+                    'value': frozenset(children[0]['value'])}
+        return {'type': 'bound_function', 'children': children,
+                'value': node['value'], 'function': spec['function'],
+                'validator': spec['validator'], 'pure': spec['pure']}
+
+    def visit_projection(self, node):
+        compiled = self.default_visit(node)
+        if self._hoisting:
+            compiled['children'][1] = self._hoist(compiled['children'][1])
+        return compiled
+
+    visit_value_projection = visit_projection
+
+    def visit_filter_projection(self, node):
+        compiled = self.visit_projection(node)
+        if self._hoisting:
+            compiled['children'][2] = self._hoist(compiled['children'][2])
+        return compiled
+
+    def visit_expref(self, node):
+        compiled = self.default_visit(node)
+        if self._hoisting:
+            compiled['children'][0] = self._hoist(compiled['children'][0])
+        return compiled
+
+    def _hoist(self, node):
+        # ``node`` is evaluated repeatedly (once for each element of a
+        # projection for example).  Any subexpression that doesn't
+        # depend on the current node, only on variables, is wrapped
+        # in a hoisted node so it's only evaluated once per scope.
+        if node['type'] in self._NOT_HOISTABLE:
+            return node
+        invariant, references_variables = self._analyze(node)
+        if invariant:
+            if references_variables:
+                return {'type': 'hoisted', 'children': [node]}
+            return node
+        if node['type'] == 'slice':
+            return node
+        hoisted = node.copy()
+        if node['type'] in self._PROJECTIONS:
+            # Only the left side is evaluated against the current node,
+            # the other children were hoisted when the projection was
+            # compiled.
+            hoisted['children'] = ([self._hoist(node['children'][0])] +
+                                   node['children'][1:])
+        else:
+            hoisted['children'] = [self._hoist(child)
+                                   for child in node['children']]
+        return hoisted
+
+    # Nodes that are never worth hoisting on their own.
+    _NOT_HOISTABLE = frozenset(['hoisted', 'literal', 'variable_ref',
+                                'expref'])
+    _PROJECTIONS = frozenset(['projection', 'value_projection',
+                              'filter_projection'])
+    # Nodes whose value only depends on their first child, the
+    # remaining children are evaluated against that value.
+    _INVARIANT_IF_FIRST_CHILD = frozenset([
+        'subexpression', 'index_expression', 'pipe', 'projection',
+        'value_projection', 'filter_projection', 'flatten', 'top_k',
+    ])
+    # Nodes whose value only depends on their children.
+    _INVARIANT_IF_CHILDREN = frozenset([
+        'comparator', 'and_expression', 'or_expression', 'not_expression',
+        'contains_literal', 'equals_any', 'hoisted',
+    ])
+
+    def _analyze(self, node):
+        # Returns a tuple of whether evaluating ``node`` is independent
+        # of the current node (``@``), and whether it references any
+        # variables.  Each node is only analyzed once.
+        try:
+            return self._analyzed[id(node)][1:]
+        except KeyError:
+            pass
+        node_type = node['type']
+        if node_type == 'slice':
+            result = (False, False)
+        else:
+            children = [self._analyze(child) for child in node['children']]
+            references_variables = (node_type == 'variable_ref' or
+                                    any(child[1] for child in children))
+            if node_type in ('literal', 'variable_ref', 'expref'):
+                # An expref is evaluated against the arguments of the
+                # function it's passed to, not against the current
+                # node.
+                invariant = True
+            elif node_type == 'bound_function':
+                invariant = node['pure'] and all(
+                    child[0] for child in children)
+            elif node_type in self._INVARIANT_IF_FIRST_CHILD:
+                invariant = children[0][0]
+            elif node_type in self._INVARIANT_IF_CHILDREN:
+                invariant = all(child[0] for child in children)
+            else:
+                invariant = False
+            result = (invariant, references_variables)
+        self._analyzed[id(node)] = (node,) + result
+        return result
+
+    def visit_index_expression(self, node):
+        compiled = self.default_visit(node)
+        children = compiled['children']
+        top_k = self._top_k(children[0], children[1])
+        if top_k is not None:
+            compiled['children'] = [top_k] + children[1:]
+        return compiled
+
+    def visit_pipe(self, node):
+        # sort_by(@, &foo) | [:10]
+        compiled = self.default_visit(node)
+        left, right = compiled['children']
+        if right['type'] == 'projection':
+            right = right['children'][0]
+        if (right['type'] == 'index_expression' and
+                right['children'][0]['type'] == 'identity'):
+            top_k = self._top_k(left, right['children'][1])
+            if top_k is not None:
+                compiled['children'] = [top_k, compiled['children'][1]]
+        return compiled
+
+    def _top_k(self, node, index_node):
+        # Returns a top_k node if ``node`` sorts an array that is then
+        # indexed or sliced by ``index_node`` such that only the first
+        # ``limit`` sorted elements are needed.
+        limit = self._top_k_limit(index_node)
+        if limit is None:
+            return None
+        reverse = False
+        if self._is_builtin_call(node, 'reverse'):
+            node = node['children'][0]
+            reverse = True
+        if self._is_builtin_call(node, 'sort'):
+            function = functions.Functions._sort_top_k
+        elif self._is_builtin_call(node, 'sort_by'):
+            function = functions.Functions._sort_by_top_k
+        else:
+            return None
+        return {'type': 'top_k', 'children': [node], 'value': limit,
+                'reverse': reverse, 'function': function}
+
+    def _top_k_limit(self, node):
+        if node['type'] == 'index':
+            if node['value'] >= 0:
+                return node['value'] + 1
+        elif node['type'] == 'slice':
+            start, stop, step = node['children']
+            if ((start is None or start >= 0) and
+                    stop is not None and stop >= 0 and
+                    (step is None or step > 0)):
+                return stop
+        return None
+
+    def _is_builtin_call(self, node, function_name):
+        return (node['type'] == 'bound_function' and
+                node['function'] is self._builtin_function(function_name))
+
+    def visit_or_expression(self, node):
+        disjuncts = []
+        self._collect_disjuncts(node, disjuncts)
+        subject = None
+        keys = []
+        for disjunct in disjuncts:
+            operands = self._literal_equality_operands(disjunct)
+            if operands is None:
+                break
+            current, literal = operands
+            if subject is None:
+                subject = current
+            elif current != subject:
+                break
+            keys.append(functions.equality_key(literal))
+        else:
+            # Every disjunct compares the same side effect free
+            # expression to a literal scalar, and the or expression
+            # evaluates to True if any comparison is True.
+            if self._is_side_effect_free(subject):
+                return {'type': 'equals_any', 'children': [subject],
+                        'value': frozenset(keys)}
+        return self.default_visit(node)
+
+    def _collect_disjuncts(self, node, disjuncts):
+        if node['type'] == 'or_expression':
+            for child in node['children']:
+                self._collect_disjuncts(child, disjuncts)
+        else:
+            disjuncts.append(node)
+
+    def _literal_equality_operands(self, node):
+        if node['type'] != 'comparator' or node['value'] != 'eq':
+            return None
+        left, right = node['children']
+        if self._is_scalar_literal(right):
+            return self.visit(left), right['value']
+        elif self._is_scalar_literal(left):
+            return self.visit(right), left['value']
+        return None
+
+    def _is_scalar_literal(self, node):
+        return (node['type'] == 'literal' and
+                isinstance(node['value'], _SCALAR_TYPES))
+
+    def _is_scalar_array_literal(self, node):
+        if node['type'] != 'literal' or not isinstance(node['value'], list):
+            return False
+        for element in node['value']:
+            if not isinstance(element, _SCALAR_TYPES):
+                return False
+        return True
+
+    def _is_side_effect_free(self, node):
+        # Used when rewriting an expression so that it's evaluated
+        # fewer times than it's written.
+        if node['type'] == 'function_expression':
+            return False
+        if node['type'] == 'bound_function' and not node['pure']:
+            return False
+        if node['type'] == 'slice':
+            return True
+        for child in node['children']:
+            if not self._is_side_effect_free(child):
+                return False
+        return True
+
+    def _builtin_function(self, function_name):
+        return functions.Functions.FUNCTION_TABLE[function_name]['function']
+
+    def _all_literals(self, children):
+        for child in children:
+            if child['type'] != 'literal':
+                return False
+        return True
+
+    def _fold_constant(self, spec, children):
+        args = [child['value'] for child in children]
+        try:
+            spec['validator'](args)
+            result = spec['function'](self._functions, *args)
+        except Exception:
+            # The call may never be evaluated (e.g. ``a || abs('x')``),
+            # so any error is left to be raised at runtime, if the
+            # call is actually reached.
+            return None
+        if type(result) not in functions._MEMOIZABLE_TYPES:
+            # A literal array or object would be the same object for
+            # every search, including any changes made to it by the
+            # caller.
+            return None
+        return ast.literal(result)
+
+    def _lookup_function(self, function_name):
+        try:
+            return self._function_table[function_name]
+        except KeyError:
+            raise exceptions.UnknownFunctionError(
+                "Unknown function: %s()" % function_name)
+
+
+def _references_variables(node):
+    if node['type'] == 'variable_ref':
+        return True
+    elif node['type'] == 'slice':
+        return False
+    for child in node['children']:
+        if _references_variables(child):
+            return True
+    return False
@@ -120,3 +120,19 @@ class EmptyExpressionError(JMESPathError):
 
 class UnknownFunctionError(JMESPathError):
     pass
+
+
+@with_str_method
+class LimitExceededError(JMESPathError):
+    def __init__(self, limit_name, limit):
+        super(LimitExceededError, self).__init__(limit_name, limit)
+        self.limit_name = limit_name
+        self.limit = limit
+
+    def __str__(self):
+        return 'Evaluation exceeded the %s limit of %s' % (
+            self.limit_name, self.limit)
+
+
+class UndefinedVariableError(JMESPathError):
+    pass
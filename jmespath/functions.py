@@ -1,5 +1,4 @@
 import math
-import json
 
 from jmespath import exceptions
 from jmespath.compat import string_type as STRING_TYPE
@@ -35,13 +34,232 @@ REVERSE_TYPES_MAP = {
 }
 
 
-def signature(*arguments):
+# Markers used by equality_key() so that values of different
+# JMESPath types never have the same key.
+_BOOLEAN_KEY = object()
+_ARRAY_KEY = object()
+_OBJECT_KEY = object()
+
+
+def equality_key(value):
+    """Return a hashable key for a JSON value.
+
+    Two values have the same key if and only if they are equal
+    according to JMESPath.  Unlike python, ``true`` is not equal
+    to ``1`` and ``false`` is not equal to ``0``, at any depth.
+    Numbers compare by value, so ``1`` and ``1.0`` are equal.
+    Raises a ``TypeError`` for values that aren't hashable and
+    aren't arrays or objects.
+
+    """
+    if isinstance(value, bool):
+        return (_BOOLEAN_KEY, value)
+    elif isinstance(value, list):
+        return (_ARRAY_KEY, tuple([equality_key(v) for v in value]))
+    elif isinstance(value, dict):
+        return (_OBJECT_KEY, frozenset(
+            [(k, equality_key(v)) for k, v in value.items()]))
+    hash(value)
+    return value
+
+
+def signature(*arguments, pure=False, expensive=False):
+    """Declare the signature of a JMESPath function.
+
+    Each argument is a dict describing the expected types of the
+    corresponding function argument.
+
+    A function that is ``pure`` always returns the same value
+    for the same arguments and has no side effects.  Calls to pure
+    functions whose arguments are all literals, and whose result is
+    a scalar (a string, number, boolean or null), are evaluated once
+    when the expression is compiled.  If a pure function is also
+    ``expensive``, its scalar results are memoized for scalar
+    arguments, so repeated calls with the same values, within a
+    search or across searches, aren't recomputed.  Arrays and objects
+    are never reused this way, since the caller may modify them.
+
+    """
     def _record_signature(func):
         func.signature = arguments
+        func.pure = pure
+        func.expensive = expensive
         return func
     return _record_signature
 
 
+_MEMOIZABLE_TYPES = frozenset([str, int, float, bool, type(None)])
+# The _MAX_MEMO_SIZE most recent results of each expensive function
+# are cached.
+_MAX_MEMO_SIZE = 1024
+
+
+def _memoize(func):
+    # We include the type of each argument in the key, otherwise
+    # 1, 1.0, and true would all share a cache entry.
+    cache = {}
+
+    def memoized(self, *args):
+        key = []
+        for arg in args:
+            if type(arg) not in _MEMOIZABLE_TYPES:
+                return func(self, *args)
+            key.append((type(arg), arg))
+        key = tuple(key)
+        try:
+            return cache[key]
+        except KeyError:
+            pass
+        result = func(self, *args)
+        if type(result) not in _MEMOIZABLE_TYPES:
+            # A cached list or dict would be shared by every search,
+            # including any changes made to it by the caller.
+            return result
+        cache[key] = result
+        if len(cache) > _MAX_MEMO_SIZE:
+            _free_memo_entries(cache)
+        return result
+    memoized.cache = cache
+    return memoized
+
+
+def _free_memo_entries(cache):
+    import random
+    for key in random.sample(list(cache.keys()), int(_MAX_MEMO_SIZE / 2)):
+        cache.pop(key, None)
+
+
+def _get_allowed_pytypes(types):
+    allowed_types = []
+    allowed_subtypes = []
+    for t in types:
+        type_ = t.split('-', 1)
+        if len(type_) == 2:
+            type_, subtype = type_
+            allowed_subtypes.append(frozenset(REVERSE_TYPES_MAP[subtype]))
+        else:
+            type_ = type_[0]
+        allowed_types.extend(REVERSE_TYPES_MAP[type_])
+    return frozenset(allowed_types), allowed_subtypes
+
+
+def _first_invalid_element(current, allowed):
+    for element in current:
+        actual_typename = type(element).__name__
+        if actual_typename not in allowed:
+            return element, actual_typename
+
+
+def _all_names_allowed(element_types, allowed):
+    for element_type in element_types:
+        if element_type.__name__ not in allowed:
+            return False
+    return True
+
+
+def _create_subtype_checker(function_name, types, allowed_subtypes):
+    # The per element checks are done by first collecting the distinct
+    # python types of the array (set(map(type, ...)) runs at C speed),
+    # and only falling back to a per element scan to find the
+    # offending value when we know there's a type error to report.
+    if len(allowed_subtypes) == 1:
+        # The easy case, we know up front what type
+        # we need to validate.
+        allowed = allowed_subtypes[0]
+
+        def check_subtypes(current):
+            if not _all_names_allowed(set(map(type, current)), allowed):
+                element, actual_typename = _first_invalid_element(
+                    current, allowed)
+                raise exceptions.JMESPathTypeError(
+                    function_name, element, actual_typename, types)
+        return check_subtypes
+
+    def check_subtypes(current):
+        if not current:
+            return
+        # Dynamic type validation.  Based on the first
+        # type we see, we validate that the remaining types
+        # match.
+        first = type(current[0]).__name__
+        for subtypes in allowed_subtypes:
+            if first in subtypes:
+                allowed = subtypes
+                break
+        else:
+            raise exceptions.JMESPathTypeError(
+                function_name, current[0], first, types)
+        if not _all_names_allowed(set(map(type, current)), allowed):
+            element, actual_typename = _first_invalid_element(
+                current, allowed)
+            raise exceptions.JMESPathTypeError(
+                function_name, element, actual_typename, types)
+    return check_subtypes
+
+
+def _create_type_checker(function_name, types):
+    # Type checking involves checking the top level type,
+    # and in the case of arrays, potentially checking the types
+    # of each element.
+    allowed_types, allowed_subtypes = _get_allowed_pytypes(types)
+    # If we're dealing with a list type, we can have
+    # additional restrictions on the type of the list
+    # elements (for example a function can require a
+    # list of numbers or a list of strings).
+    # Arrays are the only types that can have subtypes.
+    check_subtypes = None
+    if allowed_subtypes:
+        check_subtypes = _create_subtype_checker(
+            function_name, types, allowed_subtypes)
+
+    def check_type(current):
+        # We're not using isinstance() on purpose.
+        # The type model for jmespath does not map
+        # 1-1 with python types (booleans are considered
+        # integers in python for example).
+        actual_typename = type(current).__name__
+        if actual_typename not in allowed_types:
+            raise exceptions.JMESPathTypeError(
+                function_name, current,
+                TYPES_MAP.get(actual_typename, 'unknown'), types)
+        if check_subtypes is not None:
+            check_subtypes(current)
+    return check_type
+
+
+def create_validator(function_name, signature, check_types=True):
+    """Compile a function signature into an argument validator.
+
+    The returned callable accepts the list of resolved arguments
+    and raises the appropriate ``ArityError`` or ``JMESPathTypeError``
+    if they don't match ``signature``.  All the work of interpreting
+    the signature (splitting subtypes, mapping jmespath types to
+    python types) is done once, up front, instead of on every
+    function call.  If ``check_types`` is False, only the number
+    of arguments is validated.
+
+    """
+    expected_arity = len(signature)
+    variadic = bool(signature) and signature[-1].get('variadic', False)
+    checkers = []
+    for i, spec in enumerate(signature):
+        if spec['types'] and check_types:
+            checkers.append(
+                (i, _create_type_checker(function_name, spec['types'])))
+
+    def validate(args):
+        if variadic:
+            if len(args) < expected_arity:
+                raise exceptions.VariadictArityError(
+                    expected_arity, len(args), function_name)
+        elif len(args) != expected_arity:
+            raise exceptions.ArityError(
+                expected_arity, len(args), function_name)
+        for i, check_type in checkers:
+            check_type(args[i])
+    return validate
+
+
 class FunctionRegistry(type):
     def __init__(cls, name, bases, attrs):
         cls._populate_function_table()
@@ -57,9 +275,19 @@ class FunctionRegistry(type):
                 continue
             signature = getattr(method, 'signature', None)
             if signature is not None:
-                function_table[name[6:]] = {
+                function_name = name[6:]
+                pure = getattr(method, 'pure', False)
+                expensive = getattr(method, 'expensive', False)
+                if pure and expensive:
+                    method = _memoize(method)
+                function_table[function_name] = {
                     'function': method,
                     'signature': signature,
+                    'pure': pure,
+                    'expensive': expensive,
+                    'validator': create_validator(function_name, signature),
+                    'arity_validator': create_validator(
+                        function_name, signature, check_types=False),
                 }
         cls.FUNCTION_TABLE = function_table
 
@@ -75,125 +303,63 @@ class Functions(metaclass=FunctionRegistry):
         except KeyError:
             raise exceptions.UnknownFunctionError(
                 "Unknown function: %s()" % function_name)
-        function = spec['function']
-        signature = spec['signature']
-        self._validate_arguments(resolved_args, signature, function_name)
-        return function(self, *resolved_args)
+        spec['validator'](resolved_args)
+        return spec['function'](self, *resolved_args)
+
+    def call_function_unchecked(self, function_name, resolved_args):
+        """Call a function without validating the argument types.
+
+        Only the number of arguments is checked.  Calling a function
+        with arguments of the wrong type is undefined behavior, the
+        function may raise an arbitrary exception or return an
+        incorrect result.
+
+        """
+        try:
+            spec = self.FUNCTION_TABLE[function_name]
+        except KeyError:
+            raise exceptions.UnknownFunctionError(
+                "Unknown function: %s()" % function_name)
+        spec['arity_validator'](resolved_args)
+        return spec['function'](self, *resolved_args)
 
     def _validate_arguments(self, args, signature, function_name):
-        if signature and signature[-1].get('variadic'):
-            if len(args) < len(signature):
-                raise exceptions.VariadictArityError(
-                    len(signature), len(args), function_name)
-        elif len(args) != len(signature):
-            raise exceptions.ArityError(
-                len(signature), len(args), function_name)
-        return self._type_check(args, signature, function_name)
-
-    def _type_check(self, actual, signature, function_name):
-        for i in range(len(signature)):
-            allowed_types = signature[i]['types']
-            if allowed_types:
-                self._type_check_single(actual[i], allowed_types,
-                                        function_name)
-
-    def _type_check_single(self, current, types, function_name):
-        # Type checking involves checking the top level type,
-        # and in the case of arrays, potentially checking the types
-        # of each element.
-        allowed_types, allowed_subtypes = self._get_allowed_pytypes(types)
-        # We're not using isinstance() on purpose.
-        # The type model for jmespath does not map
-        # 1-1 with python types (booleans are considered
-        # integers in python for example).
-        actual_typename = type(current).__name__
-        if actual_typename not in allowed_types:
-            raise exceptions.JMESPathTypeError(
-                function_name, current,
-                self._convert_to_jmespath_type(actual_typename), types)
-        # If we're dealing with a list type, we can have
-        # additional restrictions on the type of the list
-        # elements (for example a function can require a
-        # list of numbers or a list of strings).
-        # Arrays are the only types that can have subtypes.
-        if allowed_subtypes:
-            self._subtype_check(current, allowed_subtypes,
-                                types, function_name)
-
-    def _get_allowed_pytypes(self, types):
-        allowed_types = []
-        allowed_subtypes = []
-        for t in types:
-            type_ = t.split('-', 1)
-            if len(type_) == 2:
-                type_, subtype = type_
-                allowed_subtypes.append(REVERSE_TYPES_MAP[subtype])
-            else:
-                type_ = type_[0]
-            allowed_types.extend(REVERSE_TYPES_MAP[type_])
-        return allowed_types, allowed_subtypes
-
-    def _subtype_check(self, current, allowed_subtypes, types, function_name):
-        if len(allowed_subtypes) == 1:
-            # The easy case, we know up front what type
-            # we need to validate.
-            allowed_subtypes = allowed_subtypes[0]
-            for element in current:
-                actual_typename = type(element).__name__
-                if actual_typename not in allowed_subtypes:
-                    raise exceptions.JMESPathTypeError(
-                        function_name, element, actual_typename, types)
-        elif len(allowed_subtypes) > 1 and current:
-            # Dynamic type validation.  Based on the first
-            # type we see, we validate that the remaining types
-            # match.
-            first = type(current[0]).__name__
-            for subtypes in allowed_subtypes:
-                if first in subtypes:
-                    allowed = subtypes
-                    break
-            else:
-                raise exceptions.JMESPathTypeError(
-                    function_name, current[0], first, types)
-            for element in current:
-                actual_typename = type(element).__name__
-                if actual_typename not in allowed:
-                    raise exceptions.JMESPathTypeError(
-                        function_name, element, actual_typename, types)
-
-    @signature({'types': ['number']})
+        return create_validator(function_name, signature)(args)
+
+    @signature({'types': ['number']}, pure=True)
     def _func_abs(self, arg):
         return abs(arg)
 
-    @signature({'types': ['array-number']})
+    @signature({'types': ['array-number']}, pure=True)
     def _func_avg(self, arg):
         if arg:
             return sum(arg) / len(arg)
         else:
             return None
 
-    @signature({'types': [], 'variadic': True})
+    @signature({'types': [], 'variadic': True}, pure=True)
     def _func_not_null(self, *arguments):
         for argument in arguments:
             if argument is not None:
                 return argument
 
-    @signature({'types': []})
+    @signature({'types': []}, pure=True)
     def _func_to_array(self, arg):
         if isinstance(arg, list):
             return arg
         else:
             return [arg]
 
-    @signature({'types': []})
+    @signature({'types': []}, pure=True)
     def _func_to_string(self, arg):
         if isinstance(arg, STRING_TYPE):
             return arg
         else:
+            import json
             return json.dumps(arg, separators=(',', ':'),
                               default=str)
 
-    @signature({'types': []})
+    @signature({'types': []}, pure=True)
     def _func_to_number(self, arg):
         if isinstance(arg, (list, dict, bool)):
             return None
@@ -210,88 +376,88 @@ class Functions(metaclass=FunctionRegistry):
                 except ValueError:
                     return None
 
-    @signature({'types': ['array', 'string']}, {'types': []})
+    @signature({'types': ['array', 'string']}, {'types': []}, pure=True)
     def _func_contains(self, subject, search):
         return search in subject
 
-    @signature({'types': ['string', 'array', 'object']})
+    @signature({'types': ['string', 'array', 'object']}, pure=True)
     def _func_length(self, arg):
         return len(arg)
 
-    @signature({'types': ['string']}, {'types': ['string']})
+    @signature({'types': ['string']}, {'types': ['string']}, pure=True)
     def _func_ends_with(self, search, suffix):
         return search.endswith(suffix)
 
-    @signature({'types': ['string']}, {'types': ['string']})
+    @signature({'types': ['string']}, {'types': ['string']}, pure=True)
     def _func_starts_with(self, search, suffix):
         return search.startswith(suffix)
 
-    @signature({'types': ['array', 'string']})
+    @signature({'types': ['array', 'string']}, pure=True)
     def _func_reverse(self, arg):
         if isinstance(arg, STRING_TYPE):
             return arg[::-1]
         else:
             return list(reversed(arg))
 
-    @signature({"types": ['number']})
+    @signature({"types": ['number']}, pure=True)
     def _func_ceil(self, arg):
         return math.ceil(arg)
 
-    @signature({"types": ['number']})
+    @signature({"types": ['number']}, pure=True)
     def _func_floor(self, arg):
         return math.floor(arg)
 
-    @signature({"types": ['string']}, {"types": ['array-string']})
+    @signature({"types": ['string']}, {"types": ['array-string']}, pure=True)
     def _func_join(self, separator, array):
         return separator.join(array)
 
-    @signature({'types': ['expref']}, {'types': ['array']})
+    @signature({'types': ['expref']}, {'types': ['array']}, pure=True)
     def _func_map(self, expref, arg):
         result = []
         for element in arg:
             result.append(expref.visit(expref.expression, element))
         return result
 
-    @signature({"types": ['array-number', 'array-string']})
+    @signature({"types": ['array-number', 'array-string']}, pure=True)
     def _func_max(self, arg):
         if arg:
             return max(arg)
         else:
             return None
 
-    @signature({"types": ["object"], "variadic": True})
+    @signature({"types": ["object"], "variadic": True}, pure=True)
     def _func_merge(self, *arguments):
         merged = {}
         for arg in arguments:
             merged.update(arg)
         return merged
 
-    @signature({"types": ['array-number', 'array-string']})
+    @signature({"types": ['array-number', 'array-string']}, pure=True)
     def _func_min(self, arg):
         if arg:
             return min(arg)
         else:
             return None
 
-    @signature({"types": ['array-string', 'array-number']})
+    @signature({"types": ['array-string', 'array-number']}, pure=True)
     def _func_sort(self, arg):
         return list(sorted(arg))
 
-    @signature({"types": ['array-number']})
+    @signature({"types": ['array-number']}, pure=True)
     def _func_sum(self, arg):
         return sum(arg)
 
-    @signature({"types": ['object']})
+    @signature({"types": ['object']}, pure=True)
     def _func_keys(self, arg):
         # To be consistent with .values()
         # should we also return the indices of a list?
         return list(arg.keys())
 
-    @signature({"types": ['object']})
+    @signature({"types": ['object']}, pure=True)
     def _func_values(self, arg):
         return list(arg.values())
 
-    @signature({'types': []})
+    @signature({'types': []}, pure=True)
     def _func_type(self, arg):
         if isinstance(arg, STRING_TYPE):
             return "string"
@@ -306,10 +472,14 @@ class Functions(metaclass=FunctionRegistry):
         elif arg is None:
             return "null"
 
-    @signature({'types': ['array']}, {'types': ['expref']})
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
     def _func_sort_by(self, array, expref):
         if not array:
             return array
+        keyfunc = self._create_sort_by_key_func(array, expref)
+        return list(sorted(array, key=keyfunc))
+
+    def _create_sort_by_key_func(self, array, expref):
         # sort_by allows for the expref to be either a number of
         # a string, so we have some special logic to handle this.
         # We evaluate the first array element and verify that it's
@@ -321,12 +491,103 @@ class Functions(metaclass=FunctionRegistry):
         if required_type not in ['number', 'string']:
             raise exceptions.JMESPathTypeError(
                 'sort_by', array[0], required_type, ['string', 'number'])
-        keyfunc = self._create_key_func(expref,
-                                        [required_type],
-                                        'sort_by')
-        return list(sorted(array, key=keyfunc))
+        return self._create_key_func(expref,
+                                     [required_type],
+                                     'sort_by')
+
+    # The _top_k methods are used by the compiler for expressions such
+    # as ``sort_by(@, &foo)[:10]`` where only the first ``limit``
+    # elements of the sorted array are used.  They return the same
+    # elements as ``sort()``/``sort_by()`` (or ``reverse()`` of these
+    # if ``reverse`` is True), truncated to ``limit`` elements.
+
+    def _sort_top_k(self, limit, reverse, arg):
+        return self._select_top_k(arg, arg, limit, reverse)
+
+    def _sort_by_top_k(self, limit, reverse, array, expref):
+        if not array:
+            return array
+        keyfunc = self._create_sort_by_key_func(array, expref)
+        # All the keys are computed up front, in order, so type
+        # errors are raised exactly as they are by sort_by().
+        return self._select_top_k(array, [keyfunc(x) for x in array],
+                                  limit, reverse)
+
+    def _select_top_k(self, array, keys, limit, reverse):
+        # Ties are broken by the element's index, which gives the
+        # same order as a stable sort.  reverse(sort(...)) is the
+        # stable sort reversed, so ties are then in descending
+        # index order, which is what nlargest() gives us.
+        import heapq
+        decorated = list(zip(keys, range(len(keys))))
+        if reverse:
+            selected = heapq.nlargest(limit, decorated)
+        else:
+            selected = heapq.nsmallest(limit, decorated)
+        return [array[i] for _, i in selected]
+
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
+    def _func_group_by(self, array, expref):
+        # Elements whose key is null are not included in any group.
+        keyfunc = self._create_key_func(expref, ['string', 'null'],
+                                        'group_by')
+        groups = {}
+        for element in array:
+            key = keyfunc(element)
+            if key is None:
+                continue
+            group = groups.get(key)
+            if group is None:
+                groups[key] = [element]
+            else:
+                group.append(element)
+        return groups
+
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
+    def _func_index_by(self, array, expref):
+        # If multiple elements have the same key, the last one wins.
+        keyfunc = self._create_key_func(expref, ['string', 'null'],
+                                        'index_by')
+        index = {}
+        for element in array:
+            key = keyfunc(element)
+            if key is not None:
+                index[key] = element
+        return index
+
+    @signature({'types': ['array']}, pure=True)
+    def _func_unique(self, arg):
+        return self._unique(arg, arg)
+
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
+    def _func_unique_by(self, array, expref):
+        keys = [expref.visit(expref.expression, element)
+                for element in array]
+        return self._unique(array, keys)
+
+    def _unique(self, array, keys):
+        # Keeps the first element for each distinct key, in their
+        # original order.
+        seen = set()
+        # Keys that can't be hashed (arbitrary python objects) fall
+        # back to a linear scan.
+        seen_unhashable = []
+        result = []
+        for element, key in zip(array, keys):
+            try:
+                key = equality_key(key)
+            except TypeError:
+                if key in seen_unhashable:
+                    continue
+                seen_unhashable.append(key)
+            else:
+                if key in seen:
+                    continue
+                seen.add(key)
+            result.append(element)
+        return result
 
-    @signature({'types': ['array']}, {'types': ['expref']})
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
     def _func_min_by(self, array, expref):
         keyfunc = self._create_key_func(expref,
                                         ['number', 'string'],
@@ -336,7 +597,7 @@ class Functions(metaclass=FunctionRegistry):
         else:
             return None
 
-    @signature({'types': ['array']}, {'types': ['expref']})
+    @signature({'types': ['array']}, {'types': ['expref']}, pure=True)
     def _func_max_by(self, array, expref):
         keyfunc = self._create_key_func(expref,
                                         ['number', 'string'],
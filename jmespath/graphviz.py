@@ -0,0 +1,38 @@
+"""Render an AST as a graphviz dot file, for debugging."""
+from jmespath.visitor import Visitor
+
+
+class GraphvizVisitor(Visitor):
+    def __init__(self, annotate=None):
+        super(GraphvizVisitor, self).__init__()
+        self._lines = []
+        self._count = 1
+        # An optional callable that's given a node and returns a
+        # tuple of (extra label text, extra dot attributes).
+        self._annotate = annotate
+
+    def visit(self, node, *args, **kwargs):
+        self._lines.append('digraph AST {')
+        current = '%s%s' % (node['type'], self._count)
+        self._count += 1
+        self._visit(node, current)
+        self._lines.append('}')
+        return '\n'.join(self._lines)
+
+    def _visit(self, node, current):
+        if self._annotate is None:
+            self._lines.append('%s [label="%s(%s)"]' % (
+                current, node['type'], node.get('value', '')))
+        else:
+            label, attributes = self._annotate(node)
+            self._lines.append('%s [label="%s(%s)%s" %s]' % (
+                current, node['type'], node.get('value', ''), label,
+                attributes))
+        if node['type'] == 'slice':
+            # The children of a slice are integers, not nodes.
+            return
+        for child in node.get('children', []):
+            child_name = '%s%s' % (child['type'], self._count)
+            self._count += 1
+            self._lines.append('  %s -> %s' % (current, child_name))
+            self._visit(child, child_name)
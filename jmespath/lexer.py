@@ -1,14 +1,16 @@
-import string
-import warnings
-from json import loads
-
 from jmespath.exceptions import LexerError, EmptyExpressionError
 
 
+_ASCII_LETTERS = 'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ'
+_DIGITS = '0123456789'
+
+
 class Lexer(object):
-    START_IDENTIFIER = set(string.ascii_letters + '_')
-    VALID_IDENTIFIER = set(string.ascii_letters + string.digits + '_')
-    VALID_NUMBER = set(string.digits)
+    # The string module isn't used for these because it imports re,
+    # which is slow to import.
+    START_IDENTIFIER = set(_ASCII_LETTERS + '_')
+    VALID_IDENTIFIER = set(_ASCII_LETTERS + _DIGITS + '_')
+    VALID_NUMBER = set(_DIGITS)
     WHITESPACE = set(" \t\n\r")
     SIMPLE_TOKENS = {
         '.': 'dot',
@@ -87,22 +89,9 @@ class Lexer(object):
             elif self._current == '!':
                 yield self._match_or_else('=', 'ne', 'not')
             elif self._current == '=':
-                if self._next() == '=':
-                    yield {'type': 'eq', 'value': '==',
-                        'start': self._position - 1, 'end': self._position}
-                    self._next()
-                else:
-                    if self._current is None:
-                        # If we're at the EOF, we never advanced
-                        # the position so we don't need to rewind
-                        # it back one location.
-                        position = self._position
-                    else:
-                        position = self._position - 1
-                    raise LexerError(
-                        lexer_position=position,
-                        lexer_value='=',
-                        message="Unknown token '='")
+                yield self._match_or_else('=', 'eq', 'assign')
+            elif self._current == '$':
+                yield self._consume_variable()
             else:
                 raise LexerError(lexer_position=self._position,
                                  lexer_value=self._current,
@@ -158,6 +147,8 @@ class Lexer(object):
     def _consume_literal(self):
         start = self._position
         lexeme = self._consume_until('`').replace('\\`', '`')
+        # json is imported on first use to keep ``import jmespath`` fast.
+        from json import loads
         try:
             # Assume it is valid JSON and attempt to parse.
             parsed_json = loads(lexeme)
@@ -166,6 +157,7 @@ class Lexer(object):
                 # Invalid JSON values should be converted to quoted
                 # JSON strings during the JEP-12 deprecation period.
                 parsed_json = loads('"%s"' % lexeme.lstrip())
+                import warnings
                 warnings.warn("deprecated string literal syntax",
                               PendingDeprecationWarning)
             except ValueError:
@@ -179,6 +171,7 @@ class Lexer(object):
     def _consume_quoted_identifier(self):
         start = self._position
         lexeme = '"' + self._consume_until('"') + '"'
+        from json import loads
         try:
             token_len = self._position - start
             return {'type': 'quoted_identifier', 'value': loads(lexeme),
@@ -196,6 +189,18 @@ class Lexer(object):
         return {'type': 'literal', 'value': lexeme,
                 'start': start, 'end': token_len}
 
+    def _consume_variable(self):
+        start = self._position
+        buff = ''
+        while self._next() in self.VALID_IDENTIFIER:
+            buff += self._current
+        if not buff:
+            raise LexerError(lexer_position=start,
+                             lexer_value='$',
+                             message="Unknown token '$'")
+        return {'type': 'variable', 'value': buff,
+                'start': start, 'end': start + len(buff) + 1}
+
     def _match_or_else(self, expected, match_type, else_type):
         start = self._position
         current = self._current
@@ -0,0 +1,204 @@
+"""Runtime metrics for parsing, compiling and searching.
+
+Metrics are disabled by default, and cost a single function call per
+parse or search until they're enabled::
+
+    >>> registry = jmespath.metrics.enable()
+    >>> jmespath.search('foo.bar', data)
+    >>> registry.snapshot()
+
+The following metrics are recorded:
+
+* ``cache_hits``, ``canonical_cache_hits`` and ``cache_misses``
+  (counters) for the caches of the parser.  An expression is a cache
+  hit when the same string was already parsed, and a canonical cache
+  hit when an equivalent expression was (``"foo"`` and ``foo`` for
+  instance).
+* ``cache_evictions`` (counter), the number of entries removed from
+  any of the caches of the parser.
+* ``parse_time`` and ``compile_time`` (histograms, in seconds) for the
+  expressions that weren't already parsed or compiled.
+* ``search_time`` (histogram, in seconds), labeled with the
+  ``expression``.
+* ``result_size`` (histogram), the number of elements of the result
+  of a search (the length of arrays, objects and strings, 1 for other
+  values and 0 for null).
+* ``errors`` (counter), labeled with the ``exception`` class name, for
+  the errors raised while parsing or searching.
+
+The metrics can either be pulled with ``MetricsRegistry.snapshot()``,
+or pushed to an existing metrics library by registering an exporter
+with ``MetricsRegistry.add_exporter()``.
+
+"""
+import bisect
+
+
+# The upper bounds of the histogram buckets, in seconds.
+TIME_BUCKETS = (0.00001, 0.00005, 0.0001, 0.0005, 0.001, 0.005, 0.01,
+                0.05, 0.1, 0.5, 1.0, 5.0, float('inf'))
+SIZE_BUCKETS = (0, 1, 10, 100, 1000, 10000, 100000, float('inf'))
+# Label values used once a label has too many distinct values.
+OTHER = '<other>'
+
+_registry = None
+
+
+def enable(registry=None):
+    """Start recording metrics, and return the registry they go to."""
+    global _registry
+    if registry is None:
+        registry = MetricsRegistry()
+    _registry = registry
+    return registry
+
+
+def disable():
+    """Stop recording metrics."""
+    global _registry
+    _registry = None
+
+
+def get_registry():
+    """Return the active registry, or None if metrics are disabled."""
+    return _registry
+
+
+class Counter(object):
+    def __init__(self):
+        self.value = 0
+
+    def increment(self, amount=1):
+        self.value += amount
+
+    def to_dict(self):
+        return {'value': self.value}
+
+
+class Histogram(object):
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.bucket_counts = [0] * len(buckets)
+        self.count = 0
+        self.sum = 0
+        self.min = None
+        self.max = None
+
+    def observe(self, value):
+        self.bucket_counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def to_dict(self):
+        return {'count': self.count, 'sum': self.sum,
+                'min': self.min, 'max': self.max,
+                'buckets': list(zip(self.buckets, self.bucket_counts))}
+
+
+class MetricsRegistry(object):
+    """Holds the counters and histograms recorded by jmespath.
+
+    Metrics are identified by their name and labels.  To bound the
+    memory used by the registry, a label has at most
+    ``max_label_values`` distinct values, the values recorded after
+    that are all labeled ``'<other>'``.
+
+    """
+    # Metric name -> bucket bounds of its histogram.
+    _BUCKETS = {'result_size': SIZE_BUCKETS}
+
+    def __init__(self, max_label_values=1000):
+        self.max_label_values = max_label_values
+        # (name, labels) -> Counter or Histogram.
+        self._metrics = {}
+        # label name -> set of the values seen for that label.
+        self._label_values = {}
+        self._exporters = []
+
+    def increment(self, name, amount=1, **labels):
+        key = self._key(name, labels)
+        counter = self._metrics.get(key)
+        if counter is None:
+            counter = self._metrics[key] = Counter()
+        counter.increment(amount)
+        self._export(name, key[1], amount)
+
+    def observe(self, name, value, **labels):
+        key = self._key(name, labels)
+        histogram = self._metrics.get(key)
+        if histogram is None:
+            histogram = self._metrics[key] = Histogram(
+                self._BUCKETS.get(name, TIME_BUCKETS))
+        histogram.observe(value)
+        self._export(name, key[1], value)
+
+    def get(self, name, **labels):
+        """Return the Counter or Histogram for ``name``, or None."""
+        return self._metrics.get(
+            (name, tuple(sorted(labels.items()))))
+
+    def snapshot(self):
+        """Return every metric as a list of dicts.
+
+        Each dict has the ``name``, ``type`` (``'counter'`` or
+        ``'histogram'``) and ``labels`` of the metric, along with
+        ``value`` for counters, and ``count``, ``sum``, ``min``,
+        ``max`` and ``buckets`` (a list of (upper bound, count)
+        tuples) for histograms.
+
+        """
+        collected = []
+        for (name, labels), metric in sorted(self._metrics.items(),
+                                             key=lambda item: item[0]):
+            current = metric.to_dict()
+            current['name'] = name
+            current['type'] = ('counter' if isinstance(metric, Counter)
+                               else 'histogram')
+            current['labels'] = dict(labels)
+            collected.append(current)
+        return collected
+
+    def reset(self):
+        self._metrics.clear()
+        self._label_values.clear()
+
+    def add_exporter(self, exporter):
+        """Call ``exporter(name, labels, value)`` for each recorded value.
+
+        For counters, ``value`` is the amount the counter was
+        incremented by.  Exporters are called synchronously, so they
+        should be cheap, e.g. forward the value to a statsd client.
+
+        """
+        self._exporters.append(exporter)
+
+    def remove_exporter(self, exporter):
+        self._exporters.remove(exporter)
+
+    def _key(self, name, labels):
+        if not labels:
+            return (name, ())
+        for label, value in labels.items():
+            seen = self._label_values.setdefault(label, set())
+            if value not in seen:
+                if len(seen) >= self.max_label_values:
+                    labels[label] = OTHER
+                else:
+                    seen.add(value)
+        return (name, tuple(sorted(labels.items())))
+
+    def _export(self, name, labels, value):
+        for exporter in self._exporters:
+            exporter(name, dict(labels), value)
+
+
+def result_size(result):
+    if result is None:
+        return 0
+    elif isinstance(result, (list, dict, str)):
+        return len(result)
+    return 1
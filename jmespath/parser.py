@@ -15,6 +15,14 @@ A few notes on the implementation.
 * All the nud/led tokens are on the Parser class itself, and are dispatched
   using getattr().  This keeps all the parsing logic contained to a single
   class.
+* Parsed expressions are cached in three levels.  The first is keyed
+  on the expression string.  The second is keyed on the token stream
+  with whitespace and positions removed, so ``foo.bar``, ``foo . bar``,
+  and ``"foo".bar`` share a single entry.  The third is keyed on the
+  AST itself, so expressions that only differ by redundant parentheses,
+  e.g. ``(foo).bar``, share an entry too.  AST nodes are also
+  hash-consed, structurally identical subtrees are the same object
+  across all the cached expressions.
 * We use two passes through the data.  One to create a list of token,
   then one pass through the tokens to create the AST.  While the lexer actually
   yields tokens, we convert it to a list so we can easily implement two tokens
@@ -25,12 +33,14 @@ A few notes on the implementation.
   consuming from the token iterator one token at a time.
 
 """
-import random
+import time
 
 from jmespath import lexer
 from jmespath.compat import with_repr_method
 from jmespath import ast
+from jmespath import compiler
 from jmespath import exceptions
+from jmespath import metrics
 from jmespath import visitor
 
 
@@ -48,6 +58,8 @@ class Parser(object):
         'current': 0,
         'expref': 0,
         'colon': 0,
+        'variable': 0,
+        'assign': 0,
         'pipe': 1,
         'or': 2,
         'and': 3,
@@ -74,15 +86,33 @@ class Parser(object):
     # _CACHE dict.
     _CACHE = {}
     _MAX_SIZE = 128
+    # Canonical token stream -> ParsedResult.
+    _CANONICAL_CACHE = {}
+    # id() of an interned AST -> ParsedResult.
+    _AST_CACHE = {}
+    # Canonical key -> interned AST node.  When there are more than
+    # _MAX_NODES nodes the table is cleared, already cached ASTs are
+    # unaffected.
+    _NODES = {}
+    _MAX_NODES = 8192
+    # Quoted identifiers are canonicalized as unquoted identifiers,
+    # except for the identifiers that are keywords when unquoted.
+    _KEYWORDS = frozenset(['let', 'in'])
 
     def __init__(self, lookahead=2):
         self.tokenizer = None
         self._tokens = [None] * lookahead
         self._buffer_size = lookahead
         self._index = 0
+        # Whether the last parse reused a ParsedResult from
+        # _CANONICAL_CACHE or _AST_CACHE.
+        self._reused = False
 
     def parse(self, expression):
         cached = self._CACHE.get(expression)
+        registry = metrics.get_registry()
+        if registry is not None:
+            return self._parse_with_metrics(registry, expression, cached)
         if cached is not None:
             return cached
         parsed_result = self._do_parse(expression)
@@ -91,6 +121,25 @@ class Parser(object):
             self._free_cache_entries()
         return parsed_result
 
+    def _parse_with_metrics(self, registry, expression, cached):
+        if cached is not None:
+            registry.increment('cache_hits')
+            return cached
+        start = time.perf_counter()
+        try:
+            parsed_result = self._do_parse(expression)
+        except exceptions.JMESPathError as e:
+            registry.increment('cache_misses')
+            registry.increment('errors', exception=type(e).__name__)
+            raise
+        if self._reused:
+            registry.increment('canonical_cache_hits')
+        else:
+            registry.increment('cache_misses')
+            registry.observe('parse_time', time.perf_counter() - start)
+        self._add_cache_entry(self._CACHE, expression, parsed_result)
+        return parsed_result
+
     def _do_parse(self, expression):
         try:
             return self._parse(expression)
@@ -107,13 +156,75 @@ class Parser(object):
     def _parse(self, expression):
         self.tokenizer = lexer.Lexer().tokenize(expression)
         self._tokens = list(self.tokenizer)
+        canonical_key = self._canonical_key(self._tokens)
+        cached = self._CANONICAL_CACHE.get(canonical_key)
+        self._reused = cached is not None
+        if cached is not None:
+            return cached._with_expression(expression)
         self._index = 0
         parsed = self._expression(binding_power=0)
         if not self._current_token() == 'eof':
             t = self._lookahead_token(0)
             raise exceptions.ParseError(t['start'], t['value'], t['type'],
                                         "Unexpected token: %s" % t['value'])
-        return ParsedResult(expression, parsed)
+        parsed = self._intern(parsed)
+        cached = self._AST_CACHE.get(id(parsed))
+        if cached is not None:
+            self._reused = True
+            parsed_result = cached._with_expression(expression)
+        else:
+            parsed_result = ParsedResult(expression, parsed)
+            self._add_cache_entry(self._AST_CACHE, id(parsed), parsed_result)
+        self._add_cache_entry(self._CANONICAL_CACHE, canonical_key,
+                              parsed_result)
+        return parsed_result
+
+    def _canonical_key(self, tokens):
+        # Two expressions with the same canonical key are parsed into
+        # the same AST.  Only the token types and values matter to the
+        # parser (the positions are only used in error messages).
+        key = []
+        for i, token in enumerate(tokens):
+            token_type = token['type']
+            value = token['value']
+            if token_type == 'quoted_identifier':
+                # "foo" and foo are the same field, but a quoted
+                # identifier can't be a function name or a keyword.
+                if (tokens[i + 1]['type'] != 'lparen' and
+                        value not in self._KEYWORDS):
+                    token_type = 'unquoted_identifier'
+            elif token_type == 'literal':
+                value = self._literal_key(value)
+            key.append((token_type, value))
+        return tuple(key)
+
+    def _literal_key(self, value):
+        # Literal values can be unhashable (arrays and objects), and
+        # ``1``, ``1.0``, and ``true`` must have different keys.
+        import json
+        return json.dumps(value)
+
+    def _intern(self, node):
+        # Returns the canonical node that is structurally identical
+        # to ``node``.  Children are interned first, so they can be
+        # identified by their id() in the parent's key.
+        if node['type'] == 'slice':
+            key = ('slice', tuple(node['children']))
+        else:
+            children = [self._intern(child) for child in node['children']]
+            value = node.get('value')
+            if node['type'] == 'literal':
+                value = self._literal_key(value)
+            key = (node['type'], value,
+                   tuple([id(child) for child in children]))
+            node['children'] = children
+        interned = self._NODES.get(key)
+        if interned is None:
+            if len(self._NODES) >= self._MAX_NODES:
+                self._NODES.clear()
+            self._NODES[key] = node
+            interned = node
+        return interned
 
     def _expression(self, binding_power=0):
         left_token = self._lookahead_token(0)
@@ -138,8 +249,32 @@ class Parser(object):
         return ast.literal(token['value'])
 
     def _token_nud_unquoted_identifier(self, token):
+        if token['value'] == 'let' and self._current_token() == 'variable':
+            return self._parse_let_expression()
         return ast.field(token['value'])
 
+    def _parse_let_expression(self):
+        # let $foo = expr, $bar = expr in expr
+        bindings = []
+        while True:
+            name = self._lookahead_token(0)['value']
+            self._match('variable')
+            self._match('assign')
+            bindings.append(ast.variable_binding(name, self._expression()))
+            if self._current_token() == 'comma':
+                self._match('comma')
+            else:
+                break
+        token = self._lookahead_token(0)
+        if not (token['type'] == 'unquoted_identifier' and
+                token['value'] == 'in'):
+            self._raise_parse_error_maybe_eof('in', token)
+        self._advance()
+        return ast.let_expression(bindings, self._expression())
+
+    def _token_nud_variable(self, token):
+        return ast.variable_ref(token['value'])
+
     def _token_nud_quoted_identifier(self, token):
         field = ast.field(token['value'])
         # You can't have a quoted identifier as a function
@@ -488,14 +623,29 @@ class Parser(object):
         raise exceptions.ParseError(
             lex_position, actual_value, actual_type, message)
 
-    def _free_cache_entries(self):
-        for key in random.sample(list(self._CACHE.keys()), int(self._MAX_SIZE / 2)):
-            self._CACHE.pop(key, None)
+    def _free_cache_entries(self, cache=None):
+        if cache is None:
+            cache = self._CACHE
+        import random
+        evicted = random.sample(list(cache.keys()), int(self._MAX_SIZE / 2))
+        for key in evicted:
+            cache.pop(key, None)
+        registry = metrics.get_registry()
+        if registry is not None:
+            registry.increment('cache_evictions', len(evicted))
+
+    def _add_cache_entry(self, cache, key, value):
+        cache[key] = value
+        if len(cache) > self._MAX_SIZE:
+            self._free_cache_entries(cache)
 
     @classmethod
     def purge(cls):
         """Clear the expression compilation cache."""
         cls._CACHE.clear()
+        cls._CANONICAL_CACHE.clear()
+        cls._AST_CACHE.clear()
+        cls._NODES.clear()
 
 
 @with_repr_method
@@ -503,13 +653,151 @@ class ParsedResult(object):
     def __init__(self, expression, parsed):
         self.expression = expression
         self.parsed = parsed
+        # Functions class -> AST compiled against that class.
+        self._compiled = {}
+
+    def _with_expression(self, expression):
+        # A ParsedResult for an equivalent expression, that shares
+        # the AST and compiled ASTs of this one.
+        parsed_result = ParsedResult(expression, self.parsed)
+        parsed_result._compiled = self._compiled
+        return parsed_result
+
+    def __reduce__(self):
+        # Pickled as the expression and its AST encoded as nested
+        # tuples, which is smaller and faster to load than the AST
+        # dicts.  The compiled ASTs aren't pickled, they're rebuilt on
+        # the first search after unpickling.
+        return (_load_parsed_result,
+                (type(self), _SERIALIZATION_VERSION, self.expression,
+                 _serialize_node(self.parsed)))
+
+    def search(self, value, options=None, params=None):
+        registry = metrics.get_registry()
+        if registry is not None:
+            return self._search_with_metrics(registry, value, options, params)
+        if (options is not None and options.on_slow is not None and
+                options.slow_threshold_ms is not None):
+            start = time.perf_counter()
+            result = self._search(value, options, params)
+            self._check_slow(time.perf_counter() - start, value, options,
+                             params, result)
+            return result
+        return self._search(value, options, params)
+
+    def _search(self, value, options, params, registry=None):
+        interpreter = visitor.TreeInterpreter(
+            options, variables=self._variables_from_params(params))
+        compiled = self._compile(interpreter.functions, registry)
+        result = interpreter.visit(compiled, value)
+        return result
 
-    def search(self, value, options=None):
-        interpreter = visitor.TreeInterpreter(options)
-        result = interpreter.visit(self.parsed, value)
+    def _search_with_metrics(self, registry, value, options, params):
+        start = time.perf_counter()
+        try:
+            result = self._search(value, options, params, registry)
+        except Exception as e:
+            registry.increment('errors', exception=type(e).__name__)
+            raise
+        elapsed = time.perf_counter() - start
+        registry.observe('search_time', elapsed, expression=self.expression)
+        registry.observe('result_size', metrics.result_size(result))
+        if (options is not None and options.on_slow is not None and
+                options.slow_threshold_ms is not None):
+            self._check_slow(elapsed, value, options, params, result)
         return result
 
-    def _render_dot_file(self):
+    def _check_slow(self, elapsed, value, options, params, result):
+        elapsed_ms = elapsed * 1000
+        if elapsed_ms < options.slow_threshold_ms:
+            return
+        from jmespath import profiler
+        profile = None
+        if options.profile_slow:
+            # The first run already completed within the limits, but
+            # profiling makes the second one slower, so it's only
+            # bounded by the other limits.
+            import copy
+            profile_options = copy.copy(options)
+            profile_options.deadline = None
+            profile = self.profile(value, profile_options, params)
+        options.on_slow(profiler.SlowSearch(
+            self.expression, elapsed_ms, options.slow_threshold_ms,
+            value, result, profile))
+
+    def profile(self, value, options=None, params=None, trace_memory=False):
+        """Search ``value`` and collect a per node profile.
+
+        Returns a ``jmespath.profiler.Profile``, the result of the
+        search is available as its ``result`` attribute.  If
+        ``trace_memory`` is True, the memory allocated by each node is
+        also recorded using ``tracemalloc``.
+
+        """
+        import tracemalloc
+        from jmespath import profiler
+        interpreter = profiler.ProfilingInterpreter(
+            options, variables=self._variables_from_params(params),
+            trace_memory=trace_memory)
+        compiled = self._compile(interpreter.functions)
+        started_tracing = trace_memory and not tracemalloc.is_tracing()
+        if started_tracing:
+            tracemalloc.start()
+        try:
+            result = interpreter.visit(compiled, value)
+        finally:
+            if started_tracing:
+                tracemalloc.stop()
+        return profiler.Profile(self.expression, compiled, result,
+                                interpreter.stats)
+
+    @property
+    def parameters(self):
+        """The names of the variables that must be bound by ``params``.
+
+        These are the variables referenced by the expression that
+        aren't bound by a ``let`` expression.
+
+        """
+        parameters = set()
+        _collect_free_variables(self.parsed, frozenset(), parameters)
+        return frozenset(parameters)
+
+    def _variables_from_params(self, params):
+        # Positional parameters are referenced as $1, $2, etc.
+        if params is None:
+            return None
+        elif isinstance(params, (list, tuple)):
+            return dict((str(i), value)
+                        for i, value in enumerate(params, start=1))
+        return params
+
+    def bind(self, options=None):
+        """Resolve the functions used by this expression.
+
+        The function calls in the expression are resolved against
+        the functions that will be used when searching with
+        ``options`` (the built-in functions if no
+        ``custom_functions`` are provided).  This raises an
+        ``UnknownFunctionError`` or ``ArityError`` immediately
+        instead of on the first search that evaluates the function.
+
+        """
+        self._compile(visitor.TreeInterpreter(options).functions)
+        return self
+
+    def _compile(self, functions, registry=None):
+        key = type(functions)
+        compiled = self._compiled.get(key)
+        if compiled is None:
+            start = time.perf_counter()
+            compiled = compiler.Compiler(functions).compile(self.parsed)
+            self._compiled[key] = compiled
+            if registry is not None:
+                registry.observe('compile_time', time.perf_counter() - start)
+        return compiled
+
+    def _render_dot_file(self, profile=None):
         """Render the parsed AST as a dot file.
 
         Note that this is marked as an internal method because
@@ -518,10 +806,188 @@ class ParsedResult(object):
         or for development purposes, but is not considered part
         of the public supported API.  Use at your own risk.
 
+        If a ``profile`` (see ``profile()``) is provided, the compiled
+        AST that was profiled is rendered instead, with each node
+        annotated with its stats.
+
         """
-        renderer = visitor.GraphvizVisitor()
+        if profile is not None:
+            return profile.render_dot()
+        from jmespath.graphviz import GraphvizVisitor
+        renderer = GraphvizVisitor()
         contents = renderer.visit(self.parsed)
         return contents
 
     def __repr__(self):
         return repr(self.parsed)
+
+
+class PreparedExpression(ParsedResult):
+    """An expression with parameters that are bound when searching.
+
+    Parameters are referenced in the expression as variables, either
+    by name (``$name``) or by position (``$1``, ``$2``, ...).  Their
+    values are provided with the ``params`` argument of ``search()``,
+    as a dict for named parameters or a list for positional
+    parameters.  Because the values are never part of the expression
+    string, the expression only needs to be compiled once, and the
+    values can't change the structure of the expression.
+
+    """
+    def __init__(self, expression, parsed):
+        super(PreparedExpression, self).__init__(expression, parsed)
+        self._parameters = super(PreparedExpression, self).parameters
+
+    @property
+    def parameters(self):
+        return self._parameters
+
+    def _variables_from_params(self, params):
+        variables = super(PreparedExpression, self)._variables_from_params(
+            params) or {}
+        for name in sorted(self._parameters):
+            if name not in variables:
+                raise exceptions.UndefinedVariableError(
+                    "Missing value for parameter: $%s" % name)
+        return variables
+
+
+# The version of the format ParsedResult objects are pickled with.  It
+# must be incremented whenever the format or the AST changes.
+_SERIALIZATION_VERSION = 1
+# node type -> (the minimum and maximum number of children, None if
+# there's no maximum, and the type of the value, None if the node has
+# no value).
+_NODE_SCHEMAS = {
+    'and_expression': (2, 2, None),
+    'comparator': (2, 2, str),
+    'current': (0, 0, None),
+    'expref': (1, 1, None),
+    'field': (0, 0, str),
+    'filter_projection': (3, 3, None),
+    'flatten': (1, 1, None),
+    'function_expression': (0, None, str),
+    'identity': (0, 0, None),
+    'index': (0, 0, int),
+    'index_expression': (2, None, None),
+    'key_val_pair': (1, 1, str),
+    'let_expression': (2, None, None),
+    'literal': (0, 0, object),
+    'multi_select_dict': (1, None, None),
+    'multi_select_list': (1, None, None),
+    'not_expression': (1, 1, None),
+    'or_expression': (2, 2, None),
+    'pipe': (2, 2, None),
+    'projection': (2, 2, None),
+    'slice': (3, 3, None),
+    'subexpression': (2, None, None),
+    'value_projection': (2, 2, None),
+    'variable_binding': (1, 1, str),
+    'variable_ref': (0, 0, str),
+}
+
+
+def _serialize_node(node):
+    # (type, children) or (type, children, value) if the node has a
+    # value.  The children of a slice are its start, stop, and step.
+    if node['type'] == 'slice':
+        children = tuple(node['children'])
+    else:
+        children = tuple([_serialize_node(child)
+                          for child in node['children']])
+    if 'value' in node:
+        return (node['type'], children, node['value'])
+    return (node['type'], children)
+
+
+def _load_parsed_result(cls, version, expression, serialized):
+    if version != _SERIALIZATION_VERSION:
+        raise ValueError(
+            "Unsupported serialized expression version %r, expected %r"
+            % (version, _SERIALIZATION_VERSION))
+    if not isinstance(expression, str):
+        raise ValueError("Invalid serialized expression: %r" % expression)
+    parsed = _deserialize_node(serialized)
+    cached = Parser._CACHE.get(expression)
+    if cached is not None and cached.parsed == parsed:
+        # Share the compiled ASTs of the expression already used by
+        # this process.
+        parsed_result = cls(expression, cached.parsed)
+        parsed_result._compiled = cached._compiled
+        return parsed_result
+    return cls(expression, parsed)
+
+
+def _deserialize_node(serialized):
+    # Every node is validated, so a corrupt or incompatible AST is
+    # rejected here instead of failing (or returning wrong results)
+    # when it's searched.
+    if (not isinstance(serialized, tuple) or
+            len(serialized) not in (2, 3) or
+            serialized[0] not in _NODE_SCHEMAS or
+            not isinstance(serialized[1], tuple)):
+        _invalid_node(serialized)
+    node_type, children = serialized[:2]
+    min_children, max_children, value_type = _NODE_SCHEMAS[node_type]
+    if (len(children) < min_children or
+            max_children is not None and len(children) > max_children):
+        _invalid_node(serialized)
+    if value_type is None:
+        if len(serialized) != 2:
+            _invalid_node(serialized)
+    elif (len(serialized) != 3 or
+            not _is_valid_value(node_type, value_type, serialized[2])):
+        _invalid_node(serialized)
+    if node_type == 'slice':
+        for part in children:
+            if part is not None and (not isinstance(part, int) or
+                                     isinstance(part, bool)):
+                _invalid_node(serialized)
+        node = {'type': node_type, 'children': list(children)}
+    else:
+        node = {'type': node_type,
+                'children': [_deserialize_node(child) for child in children]}
+        if not _has_valid_children(node):
+            _invalid_node(serialized)
+    if len(serialized) == 3:
+        node['value'] = serialized[2]
+    return node
+
+
+def _is_valid_value(node_type, value_type, value):
+    if not isinstance(value, value_type):
+        return False
+    elif node_type == 'index':
+        return not isinstance(value, bool)
+    elif node_type == 'comparator':
+        return value in visitor.TreeInterpreter.COMPARATOR_FUNC
+    return True
+
+
+def _has_valid_children(node):
+    children = node['children']
+    if node['type'] == 'multi_select_dict':
+        return all(child['type'] == 'key_val_pair' for child in children)
+    elif node['type'] == 'let_expression':
+        return all(child['type'] == 'variable_binding'
+                   for child in children[:-1])
+    return True
+
+
+def _invalid_node(serialized):
+    raise ValueError("Invalid serialized AST node: %r" % (serialized,))
+
+
+def _collect_free_variables(node, bound, free):
+    if node['type'] == 'variable_ref':
+        if node['value'] not in bound:
+            free.add(node['value'])
+    elif node['type'] == 'let_expression':
+        bindings = node['children'][:-1]
+        for binding in bindings:
+            _collect_free_variables(binding, bound, free)
+        inner = bound.union([binding['value'] for binding in bindings])
+        _collect_free_variables(node['children'][-1], inner, free)
+    elif node['type'] != 'slice':
+        for child in node['children']:
+            _collect_free_variables(child, bound, free)
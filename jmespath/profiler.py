@@ -0,0 +1,250 @@
+"""Per node profiling of JMESPath searches.
+
+The ``ProfilingInterpreter`` is a ``TreeInterpreter`` that records,
+for every node of the AST it evaluates, how many times the node was
+visited, the time spent evaluating it, and for projections and
+filters, the number of elements flowing in and out of them.  The
+easiest way to use it is through ``ParsedResult.profile()``::
+
+    >>> profile = jmespath.compile('foo[*].bar').profile(data)
+    >>> profile.result
+    >>> print(profile.render_tree())
+
+Profiling adds a significant overhead to every node visit, so the
+absolute timings are inflated, but they are still useful to compare
+the relative cost of the parts of an expression.
+
+Note that the profile is collected on the compiled AST (see
+``jmespath.compiler``), which is an implementation detail and may not
+map one to one with the expression as written.
+
+"""
+import time
+import tracemalloc
+
+from jmespath import visitor
+
+
+# Nodes that iterate over the elements of their first child.
+_PROJECTION_TYPES = frozenset([
+    'projection', 'value_projection', 'filter_projection', 'flatten',
+])
+
+
+class NodeStats(object):
+    def __init__(self, node):
+        self.node = node
+        #: The number of times the node was evaluated.
+        self.visits = 0
+        #: The time spent evaluating the node, including its children.
+        self.total_time = 0.0
+        #: The time spent evaluating the node, excluding its children.
+        self.self_time = 0.0
+        #: For projections, filters, and flatten, the number of
+        #  elements iterated over and the number of elements produced.
+        self.elements_in = 0
+        self.elements_out = 0
+        #: If memory is traced, the net number of bytes allocated
+        #  while evaluating the node, including its children.
+        self.memory = 0
+
+    def to_dict(self):
+        return {
+            'type': self.node['type'],
+            'value': _describe_value(self.node),
+            'visits': self.visits,
+            'total_time': self.total_time,
+            'self_time': self.self_time,
+            'elements_in': self.elements_in,
+            'elements_out': self.elements_out,
+            'memory': self.memory,
+        }
+
+
+class ProfilingInterpreter(visitor.TreeInterpreter):
+    def __init__(self, options=None, variables=None, trace_memory=False):
+        super(ProfilingInterpreter, self).__init__(options, variables)
+        self.stats = {}
+        self._trace_memory = trace_memory
+        self._clock = time.perf_counter
+        # (node, time spent in children) for each node being evaluated.
+        self._stack = []
+
+    def visit(self, node, *args, **kwargs):
+        stats = self.stats.get(id(node))
+        if stats is None:
+            stats = NodeStats(node)
+            self.stats[id(node)] = stats
+        stats.visits += 1
+        frame = [node, 0.0]
+        self._stack.append(frame)
+        if self._trace_memory:
+            memory_before = tracemalloc.get_traced_memory()[0]
+        start = self._clock()
+        try:
+            result = super(ProfilingInterpreter, self).visit(
+                node, *args, **kwargs)
+        finally:
+            elapsed = self._clock() - start
+            self._stack.pop()
+            stats.total_time += elapsed
+            stats.self_time += elapsed - frame[1]
+            if self._stack:
+                self._stack[-1][1] += elapsed
+            if self._trace_memory:
+                stats.memory += (tracemalloc.get_traced_memory()[0] -
+                                 memory_before)
+        if node['type'] in _PROJECTION_TYPES and isinstance(result, list):
+            stats.elements_out += len(result)
+        if self._stack:
+            parent = self._stack[-1][0]
+            if (parent['type'] in _PROJECTION_TYPES and
+                    parent['children'][0] is node):
+                self._record_elements_in(parent, result)
+        return result
+
+    def _record_elements_in(self, parent, base):
+        if parent['type'] == 'value_projection':
+            if isinstance(base, dict):
+                self.stats[id(parent)].elements_in += len(base)
+        elif isinstance(base, list):
+            self.stats[id(parent)].elements_in += len(base)
+
+
+class Profile(object):
+    """The result of profiling a search.
+
+    ``result`` is the result of the search, and ``nodes`` the
+    ``NodeStats`` of every node of the compiled AST, in depth first
+    order, as ``(depth, stats)`` tuples.
+
+    """
+    def __init__(self, expression, root, result, stats):
+        self.expression = expression
+        self.root = root
+        self.result = result
+        self.nodes = []
+        self._collect(root, 0, stats)
+        self.total_time = self.nodes[0][1].total_time
+
+    def _collect(self, node, depth, stats):
+        node_stats = stats.get(id(node))
+        if node_stats is None:
+            # The node was never evaluated, e.g. the right hand side
+            # of an or expression.
+            node_stats = NodeStats(node)
+        self.nodes.append((depth, node_stats))
+        for child in _child_nodes(node):
+            self._collect(child, depth + 1, stats)
+
+    def to_list(self):
+        """Return the profile as a list of dicts, one per node."""
+        collected = []
+        for depth, stats in self.nodes:
+            current = stats.to_dict()
+            current['depth'] = depth
+            collected.append(current)
+        return collected
+
+    def render_tree(self):
+        """Render the profile as an annotated, indented tree."""
+        lines = []
+        for depth, stats in self.nodes:
+            lines.append('%s%s  %s' % (
+                '  ' * depth, _describe_node(stats.node),
+                self._summary(stats)))
+        return '\n'.join(lines)
+
+    def render_dot(self):
+        """Render the profile as a graphviz dot file.
+
+        Each node is annotated with its stats and colored by
+        the fraction of the total time spent in the node itself.
+
+        """
+        stats_by_id = dict((id(stats.node), stats)
+                           for _, stats in self.nodes)
+        from jmespath.graphviz import GraphvizVisitor
+        renderer = GraphvizVisitor(
+            annotate=lambda node: self._annotate(stats_by_id[id(node)]))
+        return renderer.visit(self.root)
+
+    def _annotate(self, stats):
+        heat = 0.0
+        if self.total_time:
+            heat = min(stats.self_time / self.total_time, 1.0)
+        shade = int(255 * (1 - heat))
+        return ('\\n%s' % self._summary(stats),
+                'style=filled fillcolor="#ff%02x%02x"' % (shade, shade))
+
+    def _summary(self, stats):
+        parts = ['visits=%s' % stats.visits,
+                 'total=%.3fms' % (stats.total_time * 1000),
+                 'self=%.3fms' % (stats.self_time * 1000)]
+        if stats.node['type'] in _PROJECTION_TYPES:
+            parts.append('in=%s out=%s' % (stats.elements_in,
+                                           stats.elements_out))
+        if stats.memory:
+            parts.append('memory=%sB' % stats.memory)
+        return ' '.join(parts)
+
+
+class SlowSearch(object):
+    """Details of a search that exceeded ``Options.slow_threshold_ms``.
+
+    ``input_size`` and ``result_size`` are estimates of the size of
+    the searched value and of the result: the number of elements of
+    an array, the number of keys of an object, or None for any other
+    value.  ``profile`` is only set if ``Options.profile_slow`` is
+    True.
+
+    """
+    def __init__(self, expression, elapsed_ms, threshold_ms, value,
+                 result, profile=None):
+        self.expression = expression
+        self.elapsed_ms = elapsed_ms
+        self.threshold_ms = threshold_ms
+        self.input_type = type(value).__name__
+        self.input_size = _estimate_size(value)
+        self.result_size = _estimate_size(result)
+        self.profile = profile
+
+    def to_dict(self):
+        return {
+            'expression': self.expression,
+            'elapsed_ms': self.elapsed_ms,
+            'threshold_ms': self.threshold_ms,
+            'input_type': self.input_type,
+            'input_size': self.input_size,
+            'result_size': self.result_size,
+            'profile': (None if self.profile is None
+                        else self.profile.to_list()),
+        }
+
+
+def _estimate_size(value):
+    if isinstance(value, (list, dict)):
+        return len(value)
+    return None
+
+
+def _child_nodes(node):
+    # The children of slice nodes are integers, not nodes.
+    if node['type'] == 'slice':
+        return []
+    return node['children']
+
+
+def _describe_value(node):
+    value = node.get('value')
+    if isinstance(value, frozenset):
+        return '<%s values>' % len(value)
+    return value
+
+
+def _describe_node(node):
+    if node['type'] == 'slice':
+        return 'slice(%s)' % ':'.join(
+            '' if part is None else str(part) for part in node['children'])
+    value = _describe_value(node)
+    return '%s(%s)' % (node['type'], '' if value is None else value)
@@ -1,5 +1,7 @@
 import operator
+import time
 
+from jmespath import exceptions
 from jmespath import functions
 from jmespath.compat import string_type
 from numbers import Number
@@ -58,7 +60,10 @@ def _is_actual_number(x):
 
 class Options(object):
     """Options to control how a JMESPath function is evaluated."""
-    def __init__(self, dict_cls=None, custom_functions=None):
+    def __init__(self, dict_cls=None, custom_functions=None,
+                 validate_types=True, validation_sample_rate=None,
+                 max_steps=None, max_output_elements=None, deadline=None,
+                 slow_threshold_ms=None, on_slow=None, profile_slow=False):
         #: The class to use when creating a dict.  The interpreter
         #  may create dictionaries during the evaluation of a JMESPath
         #  expression.  For example, a multi-select hash will
@@ -69,6 +74,78 @@ class Options(object):
         #  have predictable key ordering.
         self.dict_cls = dict_cls
         self.custom_functions = custom_functions
+        #: Whether or not to validate the types of function arguments.
+        #  Setting this to False is only safe for data that is already
+        #  known to have the right shape (e.g. it's been validated
+        #  against a schema).  Function calls then skip all type
+        #  checking, including the per element checks of functions
+        #  such as sum() or sort().  If the data does not have the
+        #  expected types the behavior is undefined: a function may
+        #  raise an arbitrary exception or silently return a wrong
+        #  result.  The number of arguments is always validated.
+        self.validate_types = validate_types
+        #: When ``validate_types`` is False, the fraction of function
+        #  calls (between 0 and 1) that are still fully validated.
+        #  This is intended as a debug mode to detect data that has
+        #  drifted from its expected types, e.g. a value of 0.01 will
+        #  validate about 1% of the calls.
+        self.validation_sample_rate = validation_sample_rate
+        #: The limits below bound the amount of work a single search can
+        #  do.  When a limit is exceeded, a ``LimitExceededError`` is
+        #  raised.  Limits are checked each time an array is iterated
+        #  over (projections, filters, flattening, and arrays passed
+        #  to functions), not on every step.
+        #
+        #  ``max_steps`` is the total number of array elements that
+        #  can be iterated over.
+        self.max_steps = max_steps
+        #: The total number of elements that projections, filters, and
+        #  flatten expressions can produce.
+        self.max_output_elements = max_output_elements
+        #: The maximum number of seconds a search can take.
+        self.deadline = deadline
+        #: A callable that's called with a ``jmespath.profiler.SlowSearch``
+        #  after any search that took longer than ``slow_threshold_ms``
+        #  milliseconds.  Searches that raise an error are not reported.
+        #  Unless both are set, searches are not timed at all.
+        self.slow_threshold_ms = slow_threshold_ms
+        self.on_slow = on_slow
+        #: Whether a slow search is evaluated a second time with the
+        #  ``ProfilingInterpreter`` to include a per node profile in the
+        #  ``SlowSearch``.  This roughly triples the cost of the slow
+        #  searches, but doesn't affect the other searches.
+        self.profile_slow = profile_slow
+
+
+class _Budget(object):
+    """Tracks the work done by a search against the limits in Options."""
+    def __init__(self, max_steps=None, max_output_elements=None,
+                 deadline=None):
+        self._max_steps = max_steps
+        self._max_output_elements = max_output_elements
+        self._deadline = deadline
+        self._steps = 0
+        self._output_elements = 0
+        self._expires = None
+        if deadline is not None:
+            self._expires = time.monotonic() + deadline
+
+    def charge_steps(self, count):
+        self._steps += count
+        if self._max_steps is not None and self._steps > self._max_steps:
+            raise exceptions.LimitExceededError('max_steps', self._max_steps)
+        self._check_deadline()
+
+    def charge_output(self, count):
+        self._output_elements += count
+        if (self._max_output_elements is not None and
+                self._output_elements > self._max_output_elements):
+            raise exceptions.LimitExceededError(
+                'max_output_elements', self._max_output_elements)
+
+    def _check_deadline(self):
+        if self._expires is not None and time.monotonic() > self._expires:
+            raise exceptions.LimitExceededError('deadline', self._deadline)
 
 
 class _Expression(object):
@@ -109,7 +186,7 @@ class TreeInterpreter(Visitor):
     _EQUALITY_OPS = ['eq', 'ne']
     MAP_TYPE = dict
 
-    def __init__(self, options=None):
+    def __init__(self, options=None, variables=None):
         super(TreeInterpreter, self).__init__()
         self._dict_cls = self.MAP_TYPE
         if options is None:
@@ -121,6 +198,42 @@ class TreeInterpreter(Visitor):
             self._functions = self._options.custom_functions
         else:
             self._functions = functions.Functions()
+        self._validate_types = options.validate_types
+        self._sample_rate = options.validation_sample_rate
+        if self._sample_rate is not None:
+            # Only imported when needed to keep ``import jmespath`` fast.
+            import random
+            self._random = random.random
+        # The variables bound by let expressions, innermost scope last.
+        self._scopes = []
+        # For each scope, the cached values of hoisted expressions.
+        self._hoisted_values = []
+        self._budget = None
+        if (options.max_steps is not None or
+                options.max_output_elements is not None or
+                options.deadline is not None):
+            self._budget = _Budget(options.max_steps,
+                                   options.max_output_elements,
+                                   options.deadline)
+        if variables is not None:
+            # Variables provided by the caller (e.g. the parameters of
+            # a prepared expression) are the outermost scope.
+            self._push_scope(variables)
+        if (self._validate_types or
+                type(self._functions).call_function is not
+                functions.Functions.call_function):
+            # A subclass that provides its own call_function() is
+            # always called through it, see jmespath.compiler.
+            self._call_function = self._functions.call_function
+        elif self._sample_rate:
+            self._call_function = self._call_function_sampled
+        else:
+            self._call_function = self._functions.call_function_unchecked
+
+    @property
+    def functions(self):
+        """The ``Functions`` instance used to evaluate function calls."""
+        return self._functions
 
     def default_visit(self, node, *args, **kwargs):
         raise NotImplementedError(node['type'])
@@ -168,19 +281,87 @@ class TreeInterpreter(Visitor):
         for child in node['children']:
             current = self.visit(child, value)
             resolved_args.append(current)
-        return self._functions.call_function(node['value'], resolved_args)
+        if self._budget is not None:
+            self._charge_args(resolved_args)
+        return self._call_function(node['value'], resolved_args)
+
+    def _charge_args(self, resolved_args):
+        # Functions iterate over the arrays they're given.
+        for arg in resolved_args:
+            if isinstance(arg, list):
+                self._budget.charge_steps(len(arg))
+
+    def visit_bound_function(self, node, value):
+        # A function call that's been resolved by the compiler,
+        # see jmespath.compiler.
+        resolved_args = []
+        for child in node['children']:
+            resolved_args.append(self.visit(child, value))
+        if self._budget is not None:
+            self._charge_args(resolved_args)
+        if self._validate_types or self._is_sampled():
+            node['validator'](resolved_args)
+        return node['function'](self._functions, *resolved_args)
+
+    def visit_top_k(self, node, value):
+        # The first ``limit`` elements of a sort()/sort_by() call,
+        # see jmespath.compiler.
+        sort_node = node['children'][0]
+        resolved_args = []
+        for child in sort_node['children']:
+            resolved_args.append(self.visit(child, value))
+        if self._budget is not None:
+            self._charge_args(resolved_args)
+        if self._validate_types or self._is_sampled():
+            sort_node['validator'](resolved_args)
+        return node['function'](self._functions, node['value'],
+                                node['reverse'], *resolved_args)
+
+    def _is_sampled(self):
+        return (self._sample_rate is not None and
+                self._random() < self._sample_rate)
+
+    def _call_function_sampled(self, function_name, resolved_args):
+        if self._is_sampled():
+            return self._functions.call_function(function_name, resolved_args)
+        return self._functions.call_function_unchecked(function_name,
+                                                       resolved_args)
+
+    def visit_contains_literal(self, node, value):
+        # contains() with a literal array of scalars, the array
+        # has been converted to a frozenset by the compiler.
+        search = self.visit(node['children'][0], value)
+        try:
+            return search in node['value']
+        except TypeError:
+            # Lists and objects can't be equal to a scalar.
+            return False
+
+    def visit_equals_any(self, node, value):
+        # A chain of ``expr == literal || expr == literal ...``
+        # comparisons, the literals have been converted to a frozenset
+        # of equality keys by the compiler.
+        current = self.visit(node['children'][0], value)
+        try:
+            return functions.equality_key(current) in node['value']
+        except TypeError:
+            return False
 
     def visit_filter_projection(self, node, value):
         base = self.visit(node['children'][0], value)
         if not isinstance(base, list):
             return None
         comparator_node = node['children'][2]
+        if self._budget is not None:
+            self._budget.charge_steps(len(base))
         collected = []
         for element in base:
             if self._is_true(self.visit(comparator_node, element)):
                 current = self.visit(node['children'][1], element)
                 if current is not None:
                     collected.append(current)
+        if self._budget is not None:
+            self._budget.charge_output(len(collected))
         return collected
 
     def visit_flatten(self, node, value):
@@ -188,12 +369,16 @@ class TreeInterpreter(Visitor):
         if not isinstance(base, list):
             # Can't flatten the object if it's not a list.
             return None
+        if self._budget is not None:
+            self._budget.charge_steps(len(base))
         merged_list = []
         for element in base:
             if isinstance(element, list):
                 merged_list.extend(element)
             else:
                 merged_list.append(element)
+        if self._budget is not None:
+            self._budget.charge_output(len(merged_list))
         return merged_list
 
     def visit_identity(self, node, value):
@@ -227,6 +412,50 @@ class TreeInterpreter(Visitor):
     def visit_literal(self, node, value):
         return node['value']
 
+    def visit_let_expression(self, node, value):
+        # The bindings are evaluated in the enclosing scope, and are
+        # only visible in the body of the let expression.
+        scope = {}
+        for binding in node['children'][:-1]:
+            scope[binding['value']] = self.visit(binding['children'][0],
+                                                 value)
+        self._push_scope(scope)
+        try:
+            return self.visit(node['children'][-1], value)
+        finally:
+            self._pop_scope()
+
+    def visit_variable_ref(self, node, value):
+        name = node['value']
+        for scope in reversed(self._scopes):
+            if name in scope:
+                return scope[name]
+        raise exceptions.UndefinedVariableError(
+            "Undefined variable: $%s" % name)
+
+    def visit_hoisted(self, node, value):
+        # An expression that does not depend on the current node, only
+        # on variables, so it's evaluated at most once per scope.
+        # See jmespath.compiler.
+        if not self._hoisted_values:
+            return self.visit(node['children'][0], value)
+        cache = self._hoisted_values[-1]
+        key = id(node)
+        try:
+            return cache[key]
+        except KeyError:
+            result = self.visit(node['children'][0], value)
+            cache[key] = result
+            return result
+
+    def _push_scope(self, scope):
+        self._scopes.append(scope)
+        self._hoisted_values.append({})
+
+    def _pop_scope(self):
+        self._scopes.pop()
+        self._hoisted_values.pop()
+
     def visit_multi_select_dict(self, node, value):
         if value is None:
             return None
@@ -273,11 +502,15 @@ class TreeInterpreter(Visitor):
         base = self.visit(node['children'][0], value)
         if not isinstance(base, list):
             return None
+        if self._budget is not None:
+            self._budget.charge_steps(len(base))
         collected = []
         for element in base:
             current = self.visit(node['children'][1], element)
             if current is not None:
                 collected.append(current)
+        if self._budget is not None:
+            self._budget.charge_output(len(collected))
         return collected
 
     def visit_value_projection(self, node, value):
@@ -286,11 +519,15 @@ class TreeInterpreter(Visitor):
             base = base.values()
         except AttributeError:
             return None
+        if self._budget is not None:
+            self._budget.charge_steps(len(base))
         collected = []
         for element in base:
             current = self.visit(node['children'][1], element)
             if current is not None:
                 collected.append(current)
+        if self._budget is not None:
+            self._budget.charge_output(len(collected))
         return collected
 
     def _is_false(self, value):
@@ -304,25 +541,11 @@ class TreeInterpreter(Visitor):
         return not self._is_false(value)
 
 
-class GraphvizVisitor(Visitor):
-    def __init__(self):
-        super(GraphvizVisitor, self).__init__()
-        self._lines = []
-        self._count = 1
-
-    def visit(self, node, *args, **kwargs):
-        self._lines.append('digraph AST {')
-        current = '%s%s' % (node['type'], self._count)
-        self._count += 1
-        self._visit(node, current)
-        self._lines.append('}')
-        return '\n'.join(self._lines)
-
-    def _visit(self, node, current):
-        self._lines.append('%s [label="%s(%s)"]' % (
-            current, node['type'], node.get('value', '')))
-        for child in node.get('children', []):
-            child_name = '%s%s' % (child['type'], self._count)
-            self._count += 1
-            self._lines.append('  %s -> %s' % (current, child_name))
-            self._visit(child, child_name)
+def __getattr__(name):
+    # GraphvizVisitor is only used for debugging, it's imported on
+    # first use to keep ``import jmespath`` fast.
+    if name == 'GraphvizVisitor':
+        from jmespath.graphviz import GraphvizVisitor
+        return GraphvizVisitor
+    raise AttributeError(
+        "module %r has no attribute %r" % (__name__, name))
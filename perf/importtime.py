@@ -0,0 +1,57 @@
+"""Measure the time it takes to import jmespath.
+
+Each statement is run in a new interpreter with ``-X importtime``, and
+the self times of every module it imports are added up, excluding the
+modules that are imported by the interpreter on startup.  This is the
+cost of a cold start of a CLI or a serverless function using jmespath.
+
+"""
+import os
+import subprocess
+import sys
+
+
+STATEMENTS = {
+    'import': 'import jmespath',
+    'first_search': "import jmespath; jmespath.search('foo.bar', {})",
+}
+
+
+def measure_import_time(statement, repeat):
+    """Return the import times of ``statement``, in seconds.
+
+    Returns a tuple of the total times of ``repeat`` runs, and the
+    modules imported by the last run as a list of (module,
+    cumulative time) tuples, slowest first.
+
+    """
+    startup = set(_import_times('pass'))
+    # The first run compiles and caches the bytecode, if possible.
+    _import_times(statement)
+    totals = []
+    for _ in range(repeat):
+        modules = _import_times(statement)
+        totals.append(sum(self_time for name, (self_time, _)
+                          in modules.items() if name not in startup))
+    slowest = sorted(((name, cumulative) for name, (_, cumulative)
+                      in modules.items() if name not in startup),
+                     key=lambda item: item[1], reverse=True)
+    return totals, slowest
+
+
+def _import_times(statement):
+    # module -> (self time, cumulative time) in seconds.
+    env = dict(os.environ)
+    env.pop('PYTHONDONTWRITEBYTECODE', None)
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        stderr=subprocess.PIPE, env=env, universal_newlines=True,
+        check=True)
+    modules = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'self [us]' in line:
+            continue
+        self_time, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = (int(self_time) / 1000000.0,
+                                 int(cumulative) / 1000000.0)
+    return modules
@@ -5,158 +5,647 @@ The purpose of this script is to generate performance diagnostics for
 various jmespath expressions to be able to track the performance
 over time.  The test files are data driven similar to the
 compliance tests.
+
+Each case is timed in several phases:
+
+* ``lex``: tokenizing the expression.
+* ``parse``: parsing the expression, with the parser caches cleared.
+* ``compile``: compiling the parsed AST against the built-in functions.
+* ``search``: searching with an already compiled expression.
+* ``e2e``: ``jmespath.search()`` with the parser caches cleared.
+
+For every phase, the number of iterations per sample is calibrated so
+a sample takes at least ``--sample-time`` seconds, then ``--warmup``
+samples are discarded and ``--repeat`` samples are recorded.  The
+median, p95, and standard deviation of the time per iteration are
+reported.  Use the median to compare runs, and the stddev and p95 to
+decide if a difference is significant.
+
+Typical usage::
+
+    # Run every case in perf/cases and save the results.
+    python perf/perftest.py -o before.json
+    # ... make some changes ...
+    python perf/perftest.py -o after.json
+    python perf/perftest.py --compare before.json after.json
+
+The ``--sweep`` option runs the synthetic workloads from
+``perf/workloads.py`` instead, for each of the ``--sizes``, and reports
+the throughput (N per second) for each size along with the exponent
+of the growth of the time with N: about 1 for linear behavior, about
+2 for quadratic behavior::
+
+    python perf/perftest.py --sweep record_array,long_literal \
+        --sizes 10,100,1000,10000
+
+With ``--memory``, the memory used by each case is also measured with
+``tracemalloc`` (separately from the timings, as tracing slows down
+every allocation):
+
+* ``peak``: the peak memory allocated during ``search()``, excluding
+  the memory allocated before the search.
+* ``retained``: the memory still allocated after parsing and compiling
+  the expression, i.e. retained by the ``ParsedResult`` in the parser
+  cache, its interned AST nodes and compiled forms.
+* ``peak_per_element``: ``peak`` divided by the number of elements
+  iterated over by the projections, filters and flatten expressions of
+  the search.
+
+Memory results are written to the JSON report and compared by
+``--compare`` like the timings.
+
+With ``--import-time``, the time to import jmespath (and to run a
+first search) in a new interpreter is measured with ``-X importtime``
+instead, see ``perf/importtime.py``.
+
 """
 import argparse
-import time
-import os
+import gc
+import glob
 import json
+import math
+import os
+import platform
+import statistics
 import sys
-import timeit
+import time
+import tracemalloc
 
-_clock = timeit.default_timer
+import jmespath
+from jmespath import compiler
+from jmespath import functions
+from jmespath.lexer import Lexer
+from jmespath.parser import Parser
 
+import importtime
+import workloads
 
-from jmespath.parser import Parser
-from jmespath.lexer import Lexer
 
+_clock = time.perf_counter
 
-BENCHMARK_FILE = os.path.join(
-    os.path.dirname(os.path.dirname(os.path.abspath(__file__))),
-    'tests',
-    'compliance',
-    'benchmarks.json')
-APPROX_RUN_TIME = 0.5
+CASES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'cases')
+PHASES = ('lex', 'parse', 'compile', 'search', 'e2e')
+# Phases that don't need to search, for the cases with a bench type
+# of "parse".
+PARSE_PHASES = ('lex', 'parse', 'compile')
+RESULTS_VERSION = 1
 
 
-def run_tests(tests):
-    times = []
+def run_tests(tests, settings, out=sys.stdout):
+    results = []
     for test in tests:
-        given = test['given']
-        expression = test['expression']
-        result = test['result']
-        should_search = test['bench_type'] == 'full'
-        lex_time = _lex_time(expression)
-        parse_time = _parse_time(expression)
-        if should_search:
-            search_time = _search_time(expression, given)
-            combined_time = _combined_time(expression, given, result)
+        current = run_test(test, settings)
+        results.append(current)
+        _write_result(current, out)
+    return results
+
+
+def run_test(test, settings):
+    expression = test['expression']
+    given = test['given']
+    if test['bench_type'] == 'full':
+        _check_result(test)
+        phases = [phase for phase in settings['phases'] if phase in PHASES]
+    else:
+        phases = [phase for phase in settings['phases']
+                  if phase in PARSE_PHASES]
+    timed = {}
+    for phase in phases:
+        func = _PHASE_FUNCTIONS[phase](expression, given)
+        timed[phase] = measure(func, settings['warmup'], settings['repeat'],
+                               settings['sample_time'])
+    result = {
+        'file': test['file'],
+        'name': test['name'],
+        'expression': expression,
+        'phases': timed,
+    }
+    if settings.get('memory') and test['bench_type'] == 'full':
+        result['memory'] = measure_memory(expression, given,
+                                          settings['memory_repeat'])
+    return result
+
+
+def run_sweeps(workload_names, sizes, settings, out=sys.stdout):
+    sweeps = []
+    for workload_name in workload_names:
+        # (case name, phase) -> sweep, in the order they're generated.
+        current = {}
+        for n in sizes:
+            for test in workloads.WORKLOADS[workload_name](n):
+                for phase in test['phases']:
+                    key = (test['name'], phase)
+                    if key not in current:
+                        current[key] = {'file': test['file'],
+                                        'name': test['name'],
+                                        'phase': phase, 'points': []}
+                    current[key]['points'].append(
+                        _sweep_point(test, phase, n, settings))
+        for sweep in current.values():
+            sweep['exponent'] = _growth_exponent(sweep['points'])
+            sweeps.append(sweep)
+            _write_sweep(sweep, out)
+    return sweeps
+
+
+def _sweep_point(test, phase, n, settings):
+    try:
+        func = _PHASE_FUNCTIONS[phase](test['expression'], test['given'])
+        point = measure(func, settings['warmup'], settings['repeat'],
+                        settings['sample_time'])
+    except (RecursionError, MemoryError) as e:
+        # e.g. deep_nesting with a large N.
+        return {'n': n, 'error': type(e).__name__}
+    point['n'] = n
+    point['throughput'] = n / point['median'] if point['median'] else None
+    if settings.get('memory') and phase == 'search':
+        point['memory'] = measure_memory(test['expression'], test['given'],
+                                         settings['memory_repeat'])
+    return point
+
+
+def _growth_exponent(points):
+    # The slope of the least squares fit of log(time) against log(N).
+    xs = []
+    ys = []
+    for point in points:
+        if 'error' not in point and point['n'] > 0 and point['median'] > 0:
+            xs.append(math.log(point['n']))
+            ys.append(math.log(point['median']))
+    if len(xs) < 2:
+        return None
+    mean_x = statistics.mean(xs)
+    mean_y = statistics.mean(ys)
+    variance = sum((x - mean_x) ** 2 for x in xs)
+    if not variance:
+        return None
+    return sum((x - mean_x) * (y - mean_y)
+               for x, y in zip(xs, ys)) / variance
+
+
+def _write_sweep(sweep, out):
+    parts = []
+    for point in sweep['points']:
+        if 'error' in point:
+            parts.append('N=%s: %s' % (point['n'], point['error']))
         else:
-            search_time = 0
-            combined_time = 0
-        sys.stdout.write(
-            "lex_time: %10.5fus, parse_time: %10.5fus, search_time: %10.5fus "
-            "combined_time: %10.5fus " % (1000000 * lex_time,
-                                          1000000 * parse_time,
-                                          1000000 * search_time,
-                                          1000000 * combined_time))
-        sys.stdout.write("name: %s\n" % test['name'])
-
-
-def _lex_time(expression, clock=_clock):
-    lex = Lexer()
-    duration = 0
-    i = 0
-    while True:
-        i += 1
-        start = clock()
-        list(lex.tokenize(expression))
-        end = clock()
-        total = end - start
-        duration += total
-        if duration >= APPROX_RUN_TIME:
-            break
-    return duration / i
-
-
-def _search_time(expression, given, clock=_clock):
-    p = Parser()
-    parsed = p.parse(expression)
-    duration =  0
-    i = 0
+            parts.append('N=%s: %.3g/s' % (point['n'],
+                                           point['throughput']))
+            if 'memory' in point:
+                parts[-1] += ' %sB peak' % int(
+                    point['memory']['peak']['median'])
+    exponent = sweep['exponent']
+    out.write('%-40s %-6s %s, exponent: %s\n' % (
+        _display_name(sweep), sweep['phase'], ', '.join(parts),
+        'n/a' if exponent is None else '%.2f' % exponent))
+
+
+def run_import_times(settings, out=sys.stdout):
+    results = []
+    for name, statement in sorted(importtime.STATEMENTS.items()):
+        totals, slowest = importtime.measure_import_time(
+            statement, settings['repeat'])
+        result = {
+            'file': 'importtime',
+            'name': name,
+            'expression': statement,
+            'phases': {'import': summarize(totals)},
+            'slowest_modules': slowest[:10],
+        }
+        results.append(result)
+        _write_result(result, out)
+        for module, cumulative in slowest[:5]:
+            out.write('    %-36s %10.1fus\n' % (module, cumulative * 1000000))
+    return results
+
+
+def measure(func, warmup, repeat, sample_time):
+    """Time ``func`` and return the statistics of the time per call."""
+    iterations = _calibrate(func, sample_time)
+    samples = []
+    for i in range(warmup + repeat):
+        sample = _time_iterations(func, iterations) / iterations
+        if i >= warmup:
+            samples.append(sample)
+    return summarize(samples, iterations)
+
+
+def summarize(samples, iterations=None):
+    ordered = sorted(samples)
+    summary = {
+        'samples': len(samples),
+        'min': ordered[0],
+        'median': statistics.median(ordered),
+        'mean': statistics.mean(ordered),
+        'p95': _percentile(ordered, 0.95),
+        'stddev': statistics.stdev(ordered) if len(ordered) > 1 else 0.0,
+    }
+    if iterations is not None:
+        summary['iterations'] = iterations
+    return summary
+
+
+def measure_memory(expression, given, repeat):
+    """Measure the memory used to compile and search ``expression``."""
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    try:
+        retained = []
+        peaks = []
+        for _ in range(repeat):
+            retained.append(_retained_memory(expression))
+            peaks.append(_peak_search_memory(expression, given))
+    finally:
+        if started_tracing:
+            tracemalloc.stop()
+    peak = summarize(peaks)
+    memory = {
+        'peak': peak,
+        'retained': summarize(retained),
+        'elements': _elements_evaluated(expression, given),
+        'peak_per_element': None,
+    }
+    if memory['elements']:
+        memory['peak_per_element'] = peak['median'] / memory['elements']
+    return memory
+
+
+def _retained_memory(expression):
+    Parser.purge()
+    gc.collect()
+    before = tracemalloc.get_traced_memory()[0]
+    Parser().parse(expression).bind()
+    gc.collect()
+    return tracemalloc.get_traced_memory()[0] - before
+
+
+def _peak_search_memory(expression, given):
+    parsed = Parser().parse(expression).bind()
+    gc.collect()
+    if hasattr(tracemalloc, 'reset_peak'):
+        tracemalloc.reset_peak()
+    else:
+        # reset_peak() requires python 3.9.  Restarting tracing also
+        # resets the peak, and forgets the memory allocated so far.
+        tracemalloc.stop()
+        tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    result = parsed.search(given)
+    peak = tracemalloc.get_traced_memory()[1] - before
+    del result
+    return peak
+
+
+def _elements_evaluated(expression, given):
+    profile = Parser().parse(expression).profile(given)
+    return sum(stats.elements_in for _, stats in profile.nodes)
+
+
+def _percentile(ordered, fraction):
+    # Nearest rank percentile.
+    rank = int(math.ceil(fraction * len(ordered))) - 1
+    return ordered[max(rank, 0)]
+
+
+def _calibrate(func, sample_time):
+    # The number of iterations needed for one sample to take at least
+    # ``sample_time`` seconds, so the clock resolution is negligible.
+    iterations = 1
     while True:
-        i += 1
-        start = clock()
+        elapsed = _time_iterations(func, iterations)
+        if elapsed >= sample_time:
+            return iterations
+        if elapsed <= 0:
+            iterations *= 10
+        else:
+            iterations = max(iterations * 2,
+                             int(iterations * sample_time / elapsed * 1.1))
+
+
+def _time_iterations(func, iterations, clock=_clock):
+    loop = range(iterations)
+    start = clock()
+    for _ in loop:
+        func()
+    return clock() - start
+
+
+def _lex_phase(expression, given):
+    lexer = Lexer()
+
+    def lex():
+        list(lexer.tokenize(expression))
+    return lex
+
+
+def _parse_phase(expression, given):
+    # Clearing the (nearly empty) caches is included in the timing.
+    parser = Parser()
+
+    def parse():
+        parser.purge()
+        parser.parse(expression)
+    return parse
+
+
+def _compile_phase(expression, given):
+    parsed = Parser().parse(expression).parsed
+    functions_instance = functions.Functions()
+
+    def compile():
+        compiler.Compiler(functions_instance).compile(parsed)
+    return compile
+
+
+def _search_phase(expression, given):
+    parsed = Parser().parse(expression)
+
+    def search():
         parsed.search(given)
-        end = clock()
-        total = end - start
-        duration += total
-        if duration >= APPROX_RUN_TIME:
-            break
-    return duration / i
-
-
-def _parse_time(expression, clock=_clock):
-    best = float('inf')
-    p = Parser()
-    duration = 0
-    i = 0
-    while True:
-        i += 1
-        p.purge()
-        start = clock()
-        p.parse(expression)
-        end = clock()
-        total = end - start
-        duration += total
-        if duration >= APPROX_RUN_TIME:
-            break
-    return duration / i
-
-
-def _combined_time(expression, given, result, clock=_clock):
-    best = float('inf')
-    p = Parser()
-    duration = 0
-    i = 0
-    while True:
-        i += 1
-        p.purge()
-        start = clock()
-        r = p.parse(expression).search(given)
-        end = clock()
-        total = end - start
-        if r != result:
-            raise RuntimeError("Unexpected result, received: %s, "
-                               "expected: %s" % (r, result))
-        duration += total
-        if duration >= APPROX_RUN_TIME:
-            break
-    return duration / i
+    return search
+
+
+def _e2e_phase(expression, given):
+    def e2e():
+        Parser.purge()
+        jmespath.search(expression, given)
+    return e2e
+
+
+_PHASE_FUNCTIONS = {
+    'lex': _lex_phase,
+    'parse': _parse_phase,
+    'compile': _compile_phase,
+    'search': _search_phase,
+    'e2e': _e2e_phase,
+}
+
+
+def _check_result(test):
+    if 'result' not in test:
+        return
+    actual = jmespath.search(test['expression'], test['given'])
+    if actual != test['result']:
+        raise RuntimeError("Unexpected result for %s, received: %s, "
+                           "expected: %s" % (test['name'], actual,
+                                             test['result']))
+
+
+def _write_result(result, out):
+    parts = []
+    for phase in PHASES + ('import',):
+        stats = result['phases'].get(phase)
+        if stats is not None:
+            parts.append('%s: %10.3fus +-%6.1f%%' % (
+                phase, stats['median'] * 1000000, _relative_stddev(stats)))
+    memory = result.get('memory')
+    if memory is not None:
+        parts.append('peak: %sB, retained: %sB' % (
+            int(memory['peak']['median']), int(memory['retained']['median'])))
+        if memory['peak_per_element'] is not None:
+            parts.append('%.1fB/element' % memory['peak_per_element'])
+    out.write('%-40s %s\n' % (_display_name(result), ', '.join(parts)))
+
+
+def _relative_stddev(stats):
+    if not stats['median']:
+        return 0.0
+    return 100.0 * stats['stddev'] / stats['median']
+
+
+def _display_name(result):
+    return '%s:%s' % (os.path.splitext(result['file'])[0], result['name'])
 
 
 def load_tests(filename):
     loaded = []
     with open(filename) as f:
         data = json.load(f)
+    basename = os.path.basename(filename)
     if isinstance(data, list):
         for i, d in enumerate(data):
-            _add_cases(d, loaded, '%s-%s' % (filename, i))
+            _add_cases(d, loaded, '%s-%s' % (basename, i))
     else:
-        _add_cases(data, loaded, filename)
+        _add_cases(data, loaded, basename)
     return loaded
 
 
 def _add_cases(data, loaded, filename):
     for case in data['cases']:
         current = {
+            'file': filename,
             'given': data['given'],
-            'name': case.get('comment', case['expression']),
+            'name': case.get('name', case.get('comment',
+                                              case['expression'])),
             'expression': case['expression'],
-            'result': case.get('result'),
-            'bench_type': case['bench'],
+            'bench_type': case.get('bench', 'full'),
         }
+        if 'result' in case:
+            current['result'] = case['result']
         loaded.append(current)
     return loaded
 
 
-def main():
-    parser = argparse.ArgumentParser()
-    parser.add_argument('-f', '--filename', default=BENCHMARK_FILE)
-    args = parser.parse_args()
+def find_case_files(paths):
+    """Expand files, directories, and glob patterns into case files."""
+    filenames = []
+    for path in paths:
+        if os.path.isdir(path):
+            filenames.extend(sorted(glob.glob(os.path.join(path, '*.json'))))
+        elif glob.has_magic(path):
+            filenames.extend(sorted(glob.glob(path)))
+        else:
+            filenames.append(path)
+    return filenames
+
+
+def build_report(results, settings, sweeps=None):
+    report = {
+        'version': RESULTS_VERSION,
+        'jmespath_version': jmespath.__version__,
+        'python': platform.python_version(),
+        'implementation': platform.python_implementation(),
+        'platform': platform.platform(),
+        'settings': settings,
+        'results': results,
+    }
+    if sweeps is not None:
+        report['sweeps'] = sweeps
+    return report
+
+
+def compare(baseline, current, threshold, out=sys.stdout):
+    """Compare two reports and return the regressions.
+
+    A phase has regressed if its median is more than ``threshold``
+    (a fraction) slower than in the baseline, and the difference is
+    larger than the noise, i.e. the sum of both standard deviations.
+
+    """
+    previous = _comparable(baseline)
+    regressions = []
+    for key, after in _comparable(current).items():
+        before = previous.get(key)
+        if before is None:
+            continue
+        unit, scale, digits = _UNITS[key[1].split()[0]]
+        change = _change(before['median'], after['median'])
+        noise = before['stddev'] + after['stddev']
+        status = ''
+        if change > threshold and \
+                after['median'] - before['median'] > noise:
+            status = 'REGRESSION'
+            regressions.append((key, change))
+        elif change < -threshold and \
+                before['median'] - after['median'] > noise:
+            status = 'improvement'
+        out.write('%-40s %-24s %12.*f%s -> %12.*f%s %+7.1f%% %s\n' % (
+            key[0], key[1], digits, before['median'] * scale, unit,
+            digits, after['median'] * scale, unit, change * 100, status))
+    return regressions
+
+
+# The first word of a measurement -> (unit, scale, decimal digits)
+# used to display it.
+_UNITS = dict((phase, ('us', 1000000, 3)) for phase in PHASES)
+_UNITS['import'] = ('us', 1000000, 1)
+_UNITS['memory'] = ('B', 1, 0)
+
+
+def _comparable(report):
+    # (display name, measurement) -> stats, for every measurement in
+    # the report, including each size of the sweeps.
+    comparable = {}
+    for result in report['results']:
+        for phase, stats in result['phases'].items():
+            comparable[(_display_name(result), phase)] = stats
+        _add_memory(comparable, _display_name(result), '',
+                    result.get('memory'))
+    for sweep in report.get('sweeps', []):
+        for point in sweep['points']:
+            if 'error' not in point:
+                suffix = ' N=%s' % point['n']
+                key = (_display_name(sweep), sweep['phase'] + suffix)
+                comparable[key] = point
+                _add_memory(comparable, _display_name(sweep), suffix,
+                            point.get('memory'))
+    return comparable
+
+
+def _add_memory(comparable, name, suffix, memory):
+    if memory is not None:
+        for kind in ('peak', 'retained'):
+            comparable[(name, 'memory %s%s' % (kind, suffix))] = memory[kind]
+
+
+def _change(before, after):
+    if not before:
+        return 0.0
+    return (after - before) / before
+
+
+def _load_report(filename):
+    with open(filename) as f:
+        report = json.load(f)
+    if report.get('version') != RESULTS_VERSION:
+        raise ValueError("Unsupported results version in %s: %s"
+                         % (filename, report.get('version')))
+    return report
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(
+        description='Benchmark jmespath expressions.')
+    parser.add_argument('-f', '--filename', action='append',
+                        help='A case file, directory or glob pattern. '
+                        'Can be specified multiple times.  Defaults to '
+                        'every file in perf/cases.')
+    parser.add_argument('-k', '--filter', help='Only run the cases '
+                        'whose name contains this string.')
+    parser.add_argument('--phases', default=','.join(PHASES),
+                        help='Comma separated phases to run.')
+    parser.add_argument('--warmup', type=int, default=3,
+                        help='Samples to discard before measuring.')
+    parser.add_argument('--repeat', type=int, default=20,
+                        help='Samples to record for each phase.')
+    parser.add_argument('--sample-time', type=float, default=0.01,
+                        help='Minimum duration of a sample in seconds.')
+    parser.add_argument('-o', '--output',
+                        help='Write the results as JSON to this file.')
+    parser.add_argument('--memory', action='store_true',
+                        help='Also measure the memory used by each case.')
+    parser.add_argument('--memory-repeat', type=int, default=3,
+                        help='Memory measurements to record per case.')
+    parser.add_argument('--import-time', action='store_true',
+                        help='Measure the import time of jmespath '
+                        'instead of running the cases.')
+    parser.add_argument('--sweep', help='Comma separated synthetic '
+                        'workloads to run instead of the case files, '
+                        'or "all".  Available workloads: %s.' %
+                        ', '.join(sorted(workloads.WORKLOADS)))
+    parser.add_argument('--sizes', default='10,100,1000,10000',
+                        help='Comma separated values of N for --sweep.')
+    parser.add_argument('--compare', nargs=2,
+                        metavar=('BASELINE', 'CURRENT'),
+                        help='Compare two JSON result files, and exit '
+                        'with a status of 1 if there are regressions.')
+    parser.add_argument('--threshold', type=float, default=0.05,
+                        help='The slowdown (as a fraction) above which '
+                        'a difference is a regression.')
+    args = parser.parse_args(args)
+    if args.compare:
+        regressions = compare(_load_report(args.compare[0]),
+                              _load_report(args.compare[1]),
+                              args.threshold)
+        sys.stdout.write('%s regression(s)\n' % len(regressions))
+        return 1 if regressions else 0
+    phases = [phase for phase in args.phases.split(',') if phase]
+    unknown = set(phases) - set(PHASES)
+    if unknown:
+        parser.error('Unknown phases: %s' % ', '.join(sorted(unknown)))
+    if args.repeat < 1:
+        parser.error('--repeat must be at least 1')
+    settings = {
+        'phases': phases,
+        'warmup': args.warmup,
+        'repeat': args.repeat,
+        'sample_time': args.sample_time,
+        'memory': args.memory,
+        'memory_repeat': args.memory_repeat,
+    }
+    if args.import_time:
+        results = run_import_times(settings)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(build_report(results, settings), f, indent=2)
+        return 0
+    if args.sweep:
+        if args.sweep == 'all':
+            workload_names = sorted(workloads.WORKLOADS)
+        else:
+            workload_names = args.sweep.split(',')
+        unknown = set(workload_names) - set(workloads.WORKLOADS)
+        if unknown:
+            parser.error('Unknown workloads: %s' % ', '.join(sorted(unknown)))
+        settings['sizes'] = [int(size) for size in args.sizes.split(',')]
+        sweeps = run_sweeps(workload_names, settings['sizes'], settings)
+        if args.output:
+            with open(args.output, 'w') as f:
+                json.dump(build_report([], settings, sweeps), f, indent=2)
+        return 0
     collected_tests = []
-    collected_tests.extend(load_tests(args.filename))
-    run_tests(collected_tests)
+    for filename in find_case_files(args.filename or [CASES_DIR]):
+        collected_tests.extend(load_tests(filename))
+    if args.filter:
+        collected_tests = [test for test in collected_tests
+                           if args.filter in test['name']]
+    results = run_tests(collected_tests, settings)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(build_report(results, settings), f, indent=2)
+    return 0
 
 
 if __name__ == '__main__':
-    main()
+    sys.exit(main())
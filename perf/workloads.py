@@ -0,0 +1,153 @@
+"""Synthetic workloads whose size is controlled by a parameter N.
+
+Each workload is a function that takes N and returns a list of cases,
+in the same format as the cases loaded from the files in perf/cases
+(with ``given`` included in every case).  The cases also have a
+``phases`` key with the phases whose cost depends on N: most
+workloads scale the searched document, but some scale the expression
+itself, in which case lexing and parsing are measured.
+
+The documents are generated with a fixed seed, so the same N always
+produces the same document.
+
+"""
+import random
+import string
+
+
+SEED = 0
+
+
+def deep_nesting(n):
+    """An object nested N levels deep, e.g. {"a": {"a": ... }}."""
+    given = 'leaf'
+    for _ in range(n):
+        given = {'a': given}
+    path = '.'.join(['a'] * n)
+    return [
+        _case('deep_nesting', 'subexpression', path, given),
+        _case('deep_nesting', 'pipe', ' | '.join(['a'] * n), given),
+    ]
+
+
+def wide_object(n):
+    """An object with N keys."""
+    given = dict(('key%s' % i, i) for i in range(n))
+    return [
+        _case('wide_object', 'values', 'values(@)', given),
+        _case('wide_object', 'value_projection', '*', given),
+        _case('wide_object', 'keys', 'sort(keys(@))', given),
+        _case('wide_object', 'last_key', 'key%s' % (n - 1), given),
+    ]
+
+
+def record_array(n):
+    """An array of N records with a few fields each."""
+    rng = random.Random(SEED)
+    given = {'records': [
+        {'id': i, 'name': 'name%s' % i, 'score': rng.randint(0, 100),
+         'tags': ['tag%s' % rng.randint(0, 9) for _ in range(3)],
+         'owner': {'name': 'owner%s' % rng.randint(0, 99)}}
+        for i in range(n)]}
+    return [
+        _case('record_array', 'projection', 'records[*].name', given),
+        _case('record_array', 'filter',
+              'records[?score > `50`].id', given),
+        _case('record_array', 'nested_projection',
+              'records[*].tags[*]', given),
+        _case('record_array', 'flatten', 'records[].tags[]', given),
+        _case('record_array', 'multiselect',
+              'records[*].{id: id, owner: owner.name}', given),
+        _case('record_array', 'sort_by',
+              'sort_by(records, &score)[:10].id', given),
+        _case('record_array', 'max_by', 'max_by(records, &score).id',
+              given),
+        _case('record_array', 'group_by',
+              'keys(group_by(records, &owner.name))', given),
+    ]
+
+
+def skewed_keys(n):
+    """N records whose keys follow a Zipf like distribution.
+
+    A few keys are in almost every record, most keys are rare, so
+    the fields that are searched for are usually missing.
+
+    """
+    rng = random.Random(SEED)
+    keys = ['k%s' % i for i in range(max(n // 10, 1))]
+    weights = [1.0 / (i + 1) for i in range(len(keys))]
+    given = []
+    for i in range(n):
+        record = {}
+        for key in rng.choices(keys, weights, k=5):
+            record[key] = i
+        given.append(record)
+    rare = keys[-1]
+    return [
+        _case('skewed_keys', 'common', '[*].k0', given),
+        _case('skewed_keys', 'rare', '[*].%s' % rare, given),
+        _case('skewed_keys', 'filter_rare', '[?%s != null]' % rare, given),
+    ]
+
+
+def mixed_types(n):
+    """An array of N values of every JSON type."""
+    rng = random.Random(SEED)
+    makers = [
+        lambda i: i,
+        lambda i: i * 0.5,
+        lambda i: 'string%s' % i,
+        lambda i: i % 2 == 0,
+        lambda i: None,
+        lambda i: [i, i + 1],
+        lambda i: {'a': i},
+    ]
+    given = [rng.choice(makers)(i) for i in range(n)]
+    return [
+        _case('mixed_types', 'types', '[*].type(@)', given),
+        _case('mixed_types', 'numbers', "[?type(@) == 'number']", given),
+        _case('mixed_types', 'field', '[*].a', given),
+        _case('mixed_types', 'flatten', '[]', given),
+        _case('mixed_types', 'to_string', '[*].to_string(@)', given),
+    ]
+
+
+def long_literal(n):
+    """Expressions with a literal of N characters.
+
+    This scales the expression instead of the document, so the lexer
+    and parser are measured.
+
+    """
+    rng = random.Random(SEED)
+    text = ''.join(rng.choice(string.ascii_letters) for _ in range(n))
+    return [
+        _case('long_literal', 'raw_string', "'%s'" % text, {},
+              phases=('lex', 'parse')),
+        _case('long_literal', 'json_literal', '`"%s"`' % text, {},
+              phases=('lex', 'parse')),
+        _case('long_literal', 'quoted_identifier', '"%s"' % text, {},
+              phases=('lex', 'parse')),
+    ]
+
+
+def _case(workload, name, expression, given, phases=('search',)):
+    return {
+        'file': workload,
+        'name': name,
+        'expression': expression,
+        'given': given,
+        'bench_type': 'full',
+        'phases': phases,
+    }
+
+
+WORKLOADS = {
+    'deep_nesting': deep_nesting,
+    'wide_object': wide_object,
+    'record_array': record_array,
+    'skewed_keys': skewed_keys,
+    'mixed_types': mixed_types,
+    'long_literal': long_literal,
+}
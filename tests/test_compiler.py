@@ -0,0 +1,294 @@
+import copy
+import random
+
+from tests import unittest
+
+import jmespath
+from jmespath import compiler
+from jmespath import exceptions
+from jmespath import functions
+from jmespath import parser
+from jmespath import visitor
+
+
+class CustomFunctions(functions.Functions):
+    @functions.signature({'types': ['number']}, {'types': ['number']})
+    def _func_my_add(self, x, y):
+        return x + y
+
+
+def compile_expression(expression, functions_instance=None):
+    if functions_instance is None:
+        functions_instance = functions.Functions()
+    parsed = parser.Parser().parse(expression).parsed
+    return compiler.Compiler(functions_instance).compile(parsed)
+
+
+class TestCompiler(unittest.TestCase):
+    def test_function_calls_are_bound(self):
+        compiled = compile_expression('length(foo)')
+        self.assertEqual(compiled['type'], 'bound_function')
+        self.assertIs(compiled['function'],
+                      functions.Functions.FUNCTION_TABLE['length']['function'])
+
+    def test_parsed_ast_is_not_modified(self):
+        parsed = parser.Parser().parse('foo[*].length(bar)')
+        compiler.Compiler(functions.Functions()).compile(parsed.parsed)
+        self.assertEqual(parsed.parsed['children'][1]['type'],
+                         'function_expression')
+
+    def test_unknown_function_raised_at_compile_time(self):
+        with self.assertRaises(exceptions.UnknownFunctionError):
+            compile_expression('foo || unknown_function(@)')
+
+    def test_arity_error_raised_at_compile_time(self):
+        with self.assertRaises(exceptions.ArityError):
+            compile_expression('foo || length(@, @)')
+
+    def test_custom_functions_are_bound(self):
+        compiled = compile_expression('my_add(`1`, `2`)', CustomFunctions())
+        self.assertEqual(compiled['type'], 'bound_function')
+        with self.assertRaises(exceptions.UnknownFunctionError):
+            compile_expression('my_add(`1`, `2`)')
+
+    def test_custom_call_function_is_not_bypassed(self):
+        class DynamicFunctions(functions.Functions):
+            def call_function(self, function_name, resolved_args):
+                return function_name
+
+        self.assertEqual(
+            jmespath.search('anything(@)', {}, jmespath.Options(
+                custom_functions=DynamicFunctions())),
+            'anything')
+        for sample_rate in [None, 0.5]:
+            self.assertEqual(
+                jmespath.search('anything(@)', {}, jmespath.Options(
+                    custom_functions=DynamicFunctions(),
+                    validate_types=False,
+                    validation_sample_rate=sample_rate)),
+                'anything')
+
+    def test_pure_calls_with_literal_args_are_folded(self):
+        compiled = compile_expression('length(`[1, 2, 3]`)')
+        self.assertEqual(compiled, {'type': 'literal', 'value': 3,
+                                    'children': []})
+
+    def test_calls_returning_arrays_or_objects_are_not_folded(self):
+        compiled = compile_expression('sort(`[3, 1, 2]`)')
+        self.assertEqual(compiled['type'], 'bound_function')
+        for expression in ['sort(`[3, 1, 2]`)', 'merge(`{"a": 1}`, `{}`)']:
+            parsed = jmespath.compile(expression)
+            first = parsed.search({})
+            expected = copy.deepcopy(first)
+            if isinstance(first, list):
+                first.append(99)
+            else:
+                first['b'] = 2
+            self.assertEqual(parsed.search({}), expected)
+
+    def test_calls_with_non_literal_args_are_not_folded(self):
+        compiled = compile_expression('length(foo)')
+        self.assertEqual(compiled['type'], 'bound_function')
+
+    def test_impure_calls_are_not_folded(self):
+        compiled = compile_expression('my_add(`1`, `2`)', CustomFunctions())
+        self.assertEqual(compiled['type'], 'bound_function')
+
+    def test_errors_in_folded_calls_are_raised_at_runtime(self):
+        compiled = compile_expression("foo || abs('x')")
+        self.assertEqual(compiled['children'][1]['type'], 'bound_function')
+        self.assertEqual(jmespath.search("foo || abs('x')", {'foo': 1}), 1)
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search("foo || abs('x')", {})
+
+
+class TestTopK(unittest.TestCase):
+    def setUp(self):
+        rand = random.Random(1)
+        self.data = {
+            'records': [{'id': i, 'score': rand.randint(0, 10),
+                         'name': rand.choice('abcde')}
+                        for i in range(200)],
+            'numbers': [rand.choice([1, 1.0, 2, 3.5, -1, 0])
+                        for i in range(100)],
+            'empty': [],
+        }
+
+    def assert_same_as_uncompiled(self, expression, data=None):
+        if data is None:
+            data = self.data
+        parsed = parser.Parser().parse(expression)
+        expected = visitor.TreeInterpreter().visit(parsed.parsed, data)
+        self.assertEqual(parsed.search(data), expected)
+
+    def test_slice_of_sort_by_is_top_k(self):
+        compiled = compile_expression('sort_by(records, &score)[:10].id')
+        index_expression = compiled['children'][0]
+        self.assertEqual(index_expression['children'][0]['type'], 'top_k')
+        self.assertEqual(index_expression['children'][0]['value'], 10)
+
+    def test_pipe_to_index_is_top_k(self):
+        compiled = compile_expression('reverse(sort(numbers)) | [0]')
+        self.assertEqual(compiled['children'][0]['type'], 'top_k')
+        self.assertTrue(compiled['children'][0]['reverse'])
+
+    def test_negative_slices_are_not_top_k(self):
+        compiled = compile_expression('sort(numbers)[-3:]')
+        index_expression = compiled['children'][0]
+        self.assertEqual(index_expression['children'][0]['type'],
+                         'bound_function')
+
+    def test_top_k_results_match_full_sort(self):
+        for expression in [
+                'sort_by(records, &score)[:10]',
+                'sort_by(records, &name)[:15].id',
+                'reverse(sort_by(records, &score))[:10].id',
+                'sort_by(records, &score)[0]',
+                'sort_by(records, &score)[3]',
+                'sort_by(records, &score)[5:12:2].id',
+                'sort_by(records, &score) | [:7].id',
+                'sort(numbers)[:10]',
+                'reverse(sort(numbers))[:10]',
+                'reverse(sort(numbers)) | [2]',
+                'sort(numbers)[:1000]',
+                'sort_by(empty, &score)[:3]',
+                'sort(empty)[0]',
+                ]:
+            self.assert_same_as_uncompiled(expression)
+
+    def test_top_k_type_errors_match_sort_by(self):
+        data = [{'a': 1}, {'a': 2}, {'a': 'three'}]
+        with self.assertRaises(exceptions.JMESPathTypeError) as e:
+            jmespath.search('sort_by(@, &a)[:1]', data)
+        self.assertEqual(e.exception.current_value, 'three')
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('sort_by(@, &a)[:1]', [{'a': [1]}])
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('sort(@)[:1]', [1, 'a'])
+
+
+class TestHoisting(unittest.TestCase):
+    def test_variable_expression_in_filter_is_hoisted(self):
+        compiled = compile_expression(
+            'let $items = items in items[?price > avg($items[*].price)]')
+        condition = compiled['children'][-1]['children'][2]
+        self.assertEqual(condition['children'][1]['type'], 'hoisted')
+
+    def test_expressions_depending_on_current_node_are_not_hoisted(self):
+        compiled = compile_expression(
+            'let $x = x in items[?price > avg(prices[*].a)]')
+        condition = compiled['children'][-1]['children'][2]
+        self.assertEqual(condition['children'][1]['type'], 'bound_function')
+
+    def test_impure_functions_are_not_hoisted(self):
+        compiled = compile_expression(
+            'let $x = x in items[*].my_add($x, $x)', CustomFunctions())
+        projection = compiled['children'][-1]
+        self.assertEqual(projection['children'][1]['type'], 'bound_function')
+
+    def test_hoisted_expressions_are_evaluated_once_per_scope(self):
+        calls = []
+
+        class CountingFunctions(functions.Functions):
+            @functions.signature({'types': ['array-number']}, pure=True)
+            def _func_counted_avg(self, arg):
+                calls.append(arg)
+                return sum(arg) / len(arg)
+
+        options = jmespath.Options(custom_functions=CountingFunctions())
+        data = {'groups': [
+            {'items': [{'price': 1}, {'price': 2}, {'price': 6}]},
+            {'items': [{'price': 10}, {'price': 20}]},
+        ]}
+        result = jmespath.search(
+            'groups[*].let $items = items in '
+            'items[?price > counted_avg($items[*].price)].price',
+            data, options)
+        self.assertEqual(result, [[6], [20]])
+        self.assertEqual(len(calls), 2)
+
+    def test_expressions_without_variables_are_not_analyzed(self):
+        calls = []
+
+        class CountingCompiler(compiler.Compiler):
+            def _analyze(self, node):
+                calls.append(node)
+                return super(CountingCompiler, self)._analyze(node)
+
+        parsed = parser.Parser().parse('a' + '[*].b' * 50).parsed
+        CountingCompiler(functions.Functions()).compile(parsed)
+        self.assertEqual(calls, [])
+
+    def test_compile_time_is_linear_in_projection_depth(self):
+        calls = []
+
+        class CountingCompiler(compiler.Compiler):
+            def _analyze(self, node):
+                calls.append(node)
+                return super(CountingCompiler, self)._analyze(node)
+
+        depth = 100
+        parsed = parser.Parser().parse(
+            'let $x = x in a' + '[*].b' * depth + '.[length($x), @]').parsed
+        compiled = CountingCompiler(functions.Functions()).compile(parsed)
+        self.assertLess(len(calls), 10 * depth)
+        innermost = compiled['children'][-1]
+        for _ in range(depth + 1):
+            innermost = innermost['children'][1]
+        self.assertEqual(innermost['children'][0]['type'], 'hoisted')
+
+
+class TestMembership(unittest.TestCase):
+    def test_contains_with_literal_array_uses_set(self):
+        compiled = compile_expression('contains(`["a", "b", 1]`, foo)')
+        self.assertEqual(compiled['type'], 'contains_literal')
+        self.assertEqual(compiled['value'], frozenset(['a', 'b', 1]))
+
+    def test_contains_with_non_scalar_literal_is_not_rewritten(self):
+        compiled = compile_expression('contains(`[["a"]]`, foo)')
+        self.assertEqual(compiled['type'], 'bound_function')
+
+    def test_contains_literal_matches_contains_function(self):
+        expression = 'values[*].contains(`["a", 1, 2.0, true, null]`, @)'
+        data = {'values': ['a', 'b', 1, 1.0, 2, 0, True, False, None,
+                           [1], {'a': 1}]}
+        # The uncompiled AST calls the contains() function.
+        parsed = parser.Parser().parse(expression)
+        expected = visitor.TreeInterpreter().visit(parsed.parsed, data)
+        self.assertEqual(parsed.search(data), expected)
+
+    def test_equality_chain_uses_set(self):
+        compiled = compile_expression("a == 'x' || 'y' == a || a == `1`")
+        self.assertEqual(compiled['type'], 'equals_any')
+        self.assertEqual(compiled['children'][0]['type'], 'field')
+
+    def test_equality_chain_on_different_expressions(self):
+        compiled = compile_expression("a == 'x' || b == 'y'")
+        self.assertEqual(compiled['type'], 'or_expression')
+
+    def test_equality_chain_with_other_expressions(self):
+        compiled = compile_expression("a == 'x' || a == 'y' || b")
+        self.assertEqual(compiled['type'], 'or_expression')
+        self.assertEqual(compiled['children'][0]['type'], 'equals_any')
+
+    def test_equality_chain_uses_jmespath_equality(self):
+        expression = "[?a == `1` || a == `2.0` || a == 'x' || a == `false`]"
+        data = [{'a': 1}, {'a': 1.0}, {'a': True}, {'a': 2}, {'a': 0},
+                {'a': False}, {'a': 'x'}, {'a': [1]}, {'a': None}, {}]
+        self.assertEqual(
+            jmespath.search(expression, data),
+            [{'a': 1}, {'a': 1.0}, {'a': 2}, {'a': False}, {'a': 'x'}])
+
+
+class TestBind(unittest.TestCase):
+    def test_compile_with_options_raises_errors_early(self):
+        with self.assertRaises(exceptions.UnknownFunctionError):
+            jmespath.compile('foo || my_add(`1`, `2`)', jmespath.Options())
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        parsed = jmespath.compile('my_add(`1`, `2`)', options)
+        self.assertEqual(parsed.search({}, options), 3)
+
+    def test_compile_without_options_defers_function_resolution(self):
+        parsed = jmespath.compile('my_add(`1`, `2`)')
+        with self.assertRaises(exceptions.UnknownFunctionError):
+            parsed.search({})
@@ -5,6 +5,7 @@ import json
 
 import jmespath
 from jmespath import exceptions
+from jmespath import functions
 
 
 class TestFunctions(unittest.TestCase):
@@ -55,3 +56,128 @@ class TestFunctions(unittest.TestCase):
         self.assertEqual(
             str(exception),
             'Expected at least 1 argument for function not_null(), received 0')
+
+    def test_subtype_error_reports_first_invalid_element(self):
+        with self.assertRaises(exceptions.JMESPathTypeError) as e:
+            jmespath.search('sum(@)', [1, 2, 'three', 'four'])
+        self.assertEqual(e.exception.current_value, 'three')
+        self.assertEqual(e.exception.actual_type, 'str')
+
+    def test_dynamic_subtype_error(self):
+        with self.assertRaises(exceptions.JMESPathTypeError) as e:
+            jmespath.search('max(@)', ['a', 'b', 3])
+        self.assertEqual(e.exception.current_value, 3)
+
+    def test_validators_are_compiled_for_custom_functions(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['array-string']})
+            def _func_first(self, arg):
+                return arg[0]
+
+        spec = CustomFunctions.FUNCTION_TABLE['first']
+        spec['validator']([['a']])
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            spec['validator']([['a', 1]])
+        with self.assertRaises(exceptions.ArityError):
+            spec['validator']([])
+        # The built-in functions are still inherited.
+        self.assertIn('validator', CustomFunctions.FUNCTION_TABLE['sum'])
+
+
+class TestPureFunctions(unittest.TestCase):
+    def setUp(self):
+        self.calls = []
+        calls = self.calls
+
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['string']}, pure=True,
+                                 expensive=True)
+            def _func_expensive_upper(self, s):
+                calls.append(s)
+                return s.upper()
+
+        self.options = jmespath.Options(custom_functions=CustomFunctions())
+
+    def test_expensive_pure_functions_are_memoized(self):
+        result = jmespath.search('[*].expensive_upper(@)',
+                                 ['a', 'b', 'a', 'a'], self.options)
+        self.assertEqual(result, ['A', 'B', 'A', 'A'])
+        self.assertEqual(self.calls, ['a', 'b'])
+        jmespath.search('[*].expensive_upper(@)', ['b'], self.options)
+        self.assertEqual(self.calls, ['a', 'b'])
+
+    def test_memoized_functions_still_validate_types(self):
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('[*].expensive_upper(@)', [1], self.options)
+
+    def test_pure_literal_calls_are_evaluated_once(self):
+        parsed = jmespath.compile("[*].expensive_upper('c')")
+        parsed.search([1, 2, 3], self.options)
+        parsed.search([1, 2, 3], self.options)
+        self.assertEqual(self.calls, ['c'])
+
+    def test_memo_keys_include_the_type(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': []}, pure=True, expensive=True)
+            def _func_expensive_type(self, arg):
+                return type(arg).__name__
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        self.assertEqual(
+            jmespath.search('[*].expensive_type(@)', [1, 1.0, True],
+                            options),
+            ['int', 'float', 'bool'])
+
+    def test_arrays_and_objects_are_not_memoized(self):
+        class CustomFunctions(functions.Functions):
+            @functions.signature({'types': ['string']}, pure=True,
+                                 expensive=True)
+            def _func_expensive_split(self, s):
+                return s.split(',')
+
+        options = jmespath.Options(custom_functions=CustomFunctions())
+        result = jmespath.search('expensive_split(@)', 'a,b', options)
+        result.append('c')
+        self.assertEqual(
+            jmespath.search('expensive_split(@)', 'a,b', options), ['a', 'b'])
+
+
+class TestGroupingFunctions(unittest.TestCase):
+    def setUp(self):
+        self.data = [
+            {'name': 'a', 'kind': 'x'},
+            {'name': 'b', 'kind': 'y'},
+            {'name': 'c', 'kind': 'x'},
+            {'name': 'd'},
+        ]
+
+    def test_group_by(self):
+        self.assertEqual(
+            jmespath.search('group_by(@, &kind)', self.data),
+            {'x': [self.data[0], self.data[2]], 'y': [self.data[1]]})
+
+    def test_group_by_requires_string_keys(self):
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('group_by(@, &a)', [{'a': 1}])
+
+    def test_index_by(self):
+        self.assertEqual(
+            jmespath.search('index_by(@, &name)', self.data)['c'],
+            self.data[2])
+        self.assertEqual(
+            jmespath.search('index_by(@, &kind)', self.data),
+            {'x': self.data[2], 'y': self.data[1]})
+
+    def test_unique_uses_jmespath_equality(self):
+        self.assertEqual(
+            jmespath.search(
+                'unique(@)',
+                [1, 1.0, True, 0, False, 'a', 'a', [1], [True], [1],
+                 {'a': 1}, {'a': True}, {'a': 1}, None, None]),
+            [1, True, 0, False, 'a', [1], [True], {'a': 1}, {'a': True},
+             None])
+
+    def test_unique_by(self):
+        self.assertEqual(
+            jmespath.search('unique_by(@, &kind)[*].name', self.data),
+            ['a', 'b', 'd'])
@@ -0,0 +1,49 @@
+import inspect
+import os
+import subprocess
+import sys
+
+from tests import unittest
+
+import jmespath
+from jmespath import compat
+from jmespath import functions
+
+
+class TestLazyImports(unittest.TestCase):
+    def imported_modules(self, statement):
+        # The tree is imported instead of any installed jmespath, from
+        # whichever directory the tests are run.
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        output = subprocess.check_output([
+            sys.executable, '-c',
+            '%s; import sys; print(" ".join(sorted(sys.modules)))'
+            % statement], env=dict(os.environ, PYTHONPATH=root))
+        return output.decode('utf-8').split()
+
+    def test_import_does_not_import_submodules(self):
+        modules = self.imported_modules('import jmespath')
+        self.assertEqual(
+            [name for name in modules if name.startswith('jmespath')],
+            ['jmespath'])
+
+    def test_search_does_not_import_rarely_used_modules(self):
+        modules = self.imported_modules(
+            "import jmespath; jmespath.search('foo[?a > `1`]', {})")
+        for name in ['inspect', 'pickle', 'tempfile', 'random',
+                     'jmespath.graphviz', 'jmespath.profiler']:
+            self.assertNotIn(name, modules)
+
+    def test_lazy_attributes(self):
+        from jmespath import visitor
+        self.assertIs(jmespath.Options, visitor.Options)
+        self.assertIs(jmespath.parser, sys.modules['jmespath.parser'])
+        self.assertIn('Options', dir(jmespath))
+        with self.assertRaises(AttributeError):
+            jmespath.does_not_exist
+
+    def test_get_methods_matches_inspect(self):
+        self.assertEqual(
+            list(compat.get_methods(functions.Functions)),
+            inspect.getmembers(functions.Functions,
+                               predicate=inspect.isfunction))
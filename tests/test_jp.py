@@ -0,0 +1,336 @@
+import importlib.util
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+from tests import unittest
+
+import jmespath
+
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+JP = os.path.join(ROOT, 'bin', 'jp.py')
+
+
+def run_jp(*args, **kwargs):
+    # The tree is searched instead of any installed jmespath.
+    env = dict(os.environ, PYTHONPATH=ROOT)
+    process = subprocess.run(
+        [sys.executable, JP] + list(args), stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE, env=env, universal_newlines=True, **kwargs)
+    return process.returncode, process.stdout, process.stderr
+
+
+class TestSearch(unittest.TestCase):
+    def setUp(self):
+        self.data = {'a': {'b': [1, 2.5, 'caf\u00e9', None, True, {}, []]},
+                     'records': [{'id': i, 'tags': ['x', 'y'],
+                                  'owner': {'name': 'n%s' % i}}
+                                 for i in range(5000)]}
+
+    def test_output_is_the_same_as_json_dumps(self):
+        status, stdout, _ = run_jp('a', input=json.dumps(self.data))
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            stdout,
+            json.dumps(self.data['a'], indent=4, ensure_ascii=False) + '\n')
+
+    def test_indent(self):
+        status, stdout, _ = run_jp('--indent', '2', 'a',
+                                   input=json.dumps(self.data))
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            stdout,
+            json.dumps(self.data['a'], indent=2, ensure_ascii=False) + '\n')
+
+    def test_compact(self):
+        for expression in ['a', '@', 'records', 'records[0]', 'a.b[2]']:
+            status, stdout, _ = run_jp('-c', expression,
+                                       input=json.dumps(self.data))
+            self.assertEqual(status, 0)
+            result = jmespath.search(expression, self.data)
+            self.assertEqual(
+                stdout, json.dumps(result, separators=(',', ':'),
+                                   ensure_ascii=False) + '\n')
+
+    def test_undefined_variable(self):
+        status, stdout, stderr = run_jp('$x', input='{}')
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        self.assertEqual(
+            stderr, 'undefined-variable: Undefined variable: $x\n')
+
+
+class TestMultipleExpressions(unittest.TestCase):
+    data = '{"a": 1, "b": [1, 2], "c": {"d": "x"}}'
+
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+
+    def write_file(self, name, contents):
+        filename = os.path.join(self.tempdir, name)
+        with open(filename, 'w') as f:
+            f.write(contents)
+        return filename
+
+    def test_expressions(self):
+        status, stdout, _ = run_jp('-e', 'a', '-e', 'b[0]', '-e', 'c.d',
+                                   input=self.data)
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout), {'a': 1, 'b[0]': 1, 'c.d': 'x'})
+
+    def test_expression_argument_and_expressions(self):
+        status, stdout, _ = run_jp('a', '-e', 'b', input=self.data)
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout), {'a': 1, 'b': [1, 2]})
+
+    def test_expressions_file(self):
+        filename = self.write_file(
+            'expressions', '# The first value.\na\n\n  c.d  \n#b\n')
+        status, stdout, _ = run_jp('--expressions-file', filename, '-e', 'b',
+                                   input=self.data)
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, json.dumps(
+            {'b': [1, 2], 'a': 1, 'c.d': 'x'}, indent=4) + '\n')
+
+    def test_lines(self):
+        filename = self.write_file('data.json', self.data)
+        status, stdout, _ = run_jp('--lines', '-e', 'c', '-e', 'a', '-e',
+                                   'missing', '-f', filename)
+        self.assertEqual(status, 0)
+        self.assertEqual(stdout, '{"d":"x"}\n1\nnull\n')
+
+    def test_invalid_expression_is_reported_before_any_output(self):
+        status, stdout, stderr = run_jp('--lines', '-e', 'a', '-e', 'b.',
+                                        input=self.data)
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('syntax-error', stderr)
+
+    def test_expression_required(self):
+        filename = self.write_file('expressions', '# Nothing here.\n')
+        status, _, stderr = run_jp('--expressions-file', filename,
+                                   input=self.data)
+        self.assertEqual(status, 2)
+        self.assertIn('An expression is required', stderr)
+
+
+class TestBenchmark(unittest.TestCase):
+    data = '{"a": [{"b": 1}, {"b": 2}]}'
+
+    def test_benchmark(self):
+        status, stdout, stderr = run_jp('--benchmark', '5', 'a[*].b',
+                                        input=self.data)
+        self.assertEqual(status, 0)
+        self.assertEqual(stderr, '')
+        lines = stdout.splitlines()
+        self.assertRegex(
+            lines[0],
+            r'^input: %s bytes, JSON load: [\d.]+[mu]?s$' % len(self.data))
+        self.assertEqual(lines[1:3], ['', 'expression: a[*].b'])
+        self.assertRegex(
+            lines[3], r'^compile: cold [\d.]+[mu]?s, cached [\d.]+[mu]?s '
+            r'\(median\)$')
+        self.assertRegex(
+            lines[4], r'^search \(5 runs\): min [\d.]+[mu]?s, median .*, '
+            r'mean .*, p95 .*, p99 .*, max .*, stddev [\d.]+[mu]?s$')
+        self.assertEqual(lines[5],
+                         'result: 2 elements, 5 bytes of compact JSON')
+        self.assertEqual(len(lines), 6)
+
+    def test_profile(self):
+        status, stdout, _ = run_jp('--profile', 'a[*].b', input=self.data)
+        self.assertEqual(status, 0)
+        lines = stdout.splitlines()
+        self.assertEqual(lines[2], 'expression: a[*].b')
+        self.assertRegex(lines[3], r'^profile \([\d.]+[mu]?s\):$')
+        self.assertTrue(lines[4].startswith('projection()  visits=1 '))
+        self.assertIn('hotspots (self time):', lines)
+        self.assertNotIn('search', stdout)
+
+    def test_errors_are_reported_per_expression(self):
+        status, stdout, stderr = run_jp('--benchmark', '2', '-e', 'a.',
+                                        '-e', 'a', input=self.data)
+        self.assertEqual(status, 1)
+        self.assertIn('syntax-error', stderr)
+        self.assertIn('expression: a\n', stdout)
+        self.assertIn('result: 2 elements', stdout)
+
+    def test_invalid_combinations_are_rejected(self):
+        for args in [['--benchmark', '2', '-f', 'a.json', '-f', 'b.json'],
+                     ['--profile', '-f', '*.json'],
+                     ['--profile', '--connect', 'jp.sock'],
+                     ['--benchmark', '0']]:
+            status, stdout, stderr = run_jp('a', *args, input=self.data)
+            self.assertEqual(status, 2)
+            self.assertEqual(stdout, '')
+            self.assertIn('error:', stderr)
+
+
+class TestIterencode(unittest.TestCase):
+    def setUp(self):
+        spec = importlib.util.spec_from_file_location('jp', JP)
+        self.jp = importlib.util.module_from_spec(spec)
+        spec.loader.exec_module(self.jp)
+        # Small enough to stream most of the arrays and objects below.
+        self.jp._ONE_SHOT_ELEMENTS = 4
+
+    def test_same_as_json_dumps(self):
+        values = [
+            [], {}, 1, 'a\nb', [1, 2, 3, 4, 5, 6, 7],
+            {'a': [[1, 2], [3, 4, 5, 6, 7]], 'b': {'c': list(range(9))}},
+            [{'a': 1}, [], {}, [list(range(5))], 'x', None, True, 1.5],
+            {1: [1, 2, 3, 4, 5]},
+        ]
+        for kwargs in [{'separators': (',', ':')}, {'indent': 4},
+                       {'indent': 0}]:
+            encoder = json.JSONEncoder(ensure_ascii=False, **kwargs)
+            for value in values:
+                self.assertEqual(
+                    ''.join(self.jp._iterencode(encoder, value)),
+                    json.dumps(value, ensure_ascii=False, **kwargs))
+
+
+class TestSearchFiles(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        for i in range(10):
+            self.write_file('f%s.json' % i, json.dumps({'a': {'b': i}}))
+
+    def write_file(self, name, contents):
+        with open(os.path.join(self.tempdir, name), 'w') as f:
+            f.write(contents)
+
+    def search(self, *args):
+        return run_jp(*args, cwd=self.tempdir)
+
+    def parse_lines(self, stdout):
+        return [json.loads(line) for line in stdout.splitlines()]
+
+    def test_glob(self):
+        status, stdout, _ = self.search('a.b', '-f', 'f*.json')
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            self.parse_lines(stdout),
+            [{'file': 'f%s.json' % i, 'result': i} for i in range(10)])
+
+    def test_jobs_ordered(self):
+        status, stdout, _ = self.search('a.b', '-f', 'f*.json', '-j', '2',
+                                        '--ordered')
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            self.parse_lines(stdout),
+            [{'file': 'f%s.json' % i, 'result': i} for i in range(10)])
+
+    def test_jobs_unordered(self):
+        status, stdout, _ = self.search('a.b', '-f', 'f*.json', '-j', '2')
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            sorted(self.parse_lines(stdout), key=lambda line: line['file']),
+            [{'file': 'f%s.json' % i, 'result': i} for i in range(10)])
+
+    def test_multiple_expressions(self):
+        status, stdout, _ = self.search('-e', 'a.b', '-e', 'a', '-f',
+                                        'f1*.json', '-j', '2')
+        self.assertEqual(status, 0)
+        self.assertEqual(
+            self.parse_lines(stdout),
+            [{'file': 'f1.json', 'result': {'a.b': 1, 'a': {'b': 1}}}])
+
+    def test_invalid_file_is_reported(self):
+        self.write_file('invalid.json', '{')
+        status, stdout, _ = self.search('a.b', '-f', 'invalid.json', '-f',
+                                        'f1.json', '-j', '2', '--ordered')
+        self.assertEqual(status, 1)
+        lines = self.parse_lines(stdout)
+        self.assertEqual(lines[0]['file'], 'invalid.json')
+        self.assertIn('error', lines[0])
+        self.assertEqual(lines[1], {'file': 'f1.json', 'result': 1})
+
+    def test_glob_without_matches(self):
+        status, stdout, stderr = self.search('a.b', '-f', 'missing*.json',
+                                             '-j', '2')
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('no files match missing*.json', stderr)
+
+    def test_invalid_expression(self):
+        status, stdout, stderr = self.search('a.', '-f', 'f*.json', '-j', '2')
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('syntax-error', stderr)
+
+
+@unittest.skipUnless(hasattr(os, 'fork'), 'requires os.fork()')
+class TestDaemon(unittest.TestCase):
+    def setUp(self):
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
+        self.socket_path = os.path.join(self.tempdir, 'jp.sock')
+        env = dict(os.environ, PYTHONPATH=ROOT)
+        self.server = subprocess.Popen(
+            [sys.executable, JP, '--serve', self.socket_path,
+             '--workers', '1'], env=env)
+        self.addCleanup(self.stop_server)
+        for _ in range(100):
+            if os.path.exists(self.socket_path):
+                break
+            time.sleep(0.05)
+        else:
+            self.fail('The daemon did not start')
+
+    def stop_server(self):
+        self.server.terminate()
+        self.server.wait()
+
+    def connect(self, *args, **kwargs):
+        return run_jp('--connect', self.socket_path, *args, **kwargs)
+
+    def test_search(self):
+        status, stdout, stderr = self.connect('a', input='{"a": [1, 2]}')
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout), [1, 2])
+        self.assertEqual(stderr, '')
+
+    def test_large_output_is_streamed(self):
+        data = {'a': ['x' * 10] * 20000}
+        status, stdout, _ = self.connect('-c', 'a', input=json.dumps(data))
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout), data['a'])
+
+    def test_jmespath_error(self):
+        status, stdout, stderr = self.connect('a.', input='{}')
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '')
+        self.assertIn('syntax-error', stderr)
+
+    def test_invalid_input(self):
+        status, _, stderr = self.connect('a', input='{"a"')
+        self.assertEqual(status, 1)
+        self.assertIn('JSONDecodeError', stderr)
+
+    def test_unexpected_error(self):
+        status, _, stderr = self.connect('[' * 3000, input='{}')
+        self.assertEqual(status, 1)
+        self.assertIn('RecursionError', stderr)
+        # The worker is still serving requests.
+        status, stdout, _ = self.connect('a', input='{"a": 1}')
+        self.assertEqual(status, 0)
+        self.assertEqual(json.loads(stdout), 1)
+
+    def test_error_after_partial_output(self):
+        status, stdout, stderr = self.connect(
+            '--lines', '-e', 'a', '-e', 'abs(a)', input='{"a": "x"}')
+        self.assertEqual(status, 1)
+        self.assertEqual(stdout, '"x"\n')
+        self.assertIn('invalid-type', stderr)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -155,6 +155,21 @@ class TestRegexLexer(unittest.TestCase):
         with self.assertRaisesRegex(LexerError, "Unknown token"):
             list(self.lexer.tokenize('foo-bar'))
 
+    def test_variable(self):
+        tokens = list(self.lexer.tokenize('$foo = bar'))
+        self.assertEqual(
+            tokens,
+            [{'type': 'variable', 'value': 'foo', 'start': 0, 'end': 4},
+             {'type': 'assign', 'value': '=', 'start': 5, 'end': 5},
+             {'type': 'unquoted_identifier', 'value': 'bar',
+              'start': 7, 'end': 10},
+             {'type': 'eof', 'value': '', 'start': 10, 'end': 10}]
+        )
+
+    def test_variable_requires_a_name(self):
+        with self.assertRaisesRegex(LexerError, "Unknown token"):
+            list(self.lexer.tokenize('$ == foo'))
+
 
 if __name__ == '__main__':
     unittest.main()
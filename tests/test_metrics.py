@@ -0,0 +1,154 @@
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath import metrics
+from jmespath import parser
+
+
+class TestMetricsRegistry(unittest.TestCase):
+    def setUp(self):
+        self.registry = metrics.MetricsRegistry()
+
+    def test_counters(self):
+        self.registry.increment('hits')
+        self.registry.increment('hits', 2)
+        self.assertEqual(self.registry.get('hits').value, 3)
+
+    def test_histograms(self):
+        for value in [0, 5, 50]:
+            self.registry.observe('result_size', value)
+        histogram = self.registry.get('result_size')
+        self.assertEqual(histogram.count, 3)
+        self.assertEqual(histogram.sum, 55)
+        self.assertEqual(histogram.min, 0)
+        self.assertEqual(histogram.max, 50)
+        self.assertEqual(histogram.to_dict()['buckets'][:4],
+                         [(0, 1), (1, 0), (10, 1), (100, 1)])
+
+    def test_labels_are_separate_metrics(self):
+        self.registry.increment('errors', exception='ParseError')
+        self.registry.increment('errors', exception='ArityError')
+        self.registry.increment('errors', exception='ParseError')
+        self.assertEqual(
+            self.registry.get('errors', exception='ParseError').value, 2)
+        self.assertEqual(
+            self.registry.get('errors', exception='ArityError').value, 1)
+        self.assertIsNone(self.registry.get('errors'))
+
+    def test_label_values_are_bounded(self):
+        registry = metrics.MetricsRegistry(max_label_values=2)
+        for expression in ['a', 'b', 'c', 'd']:
+            registry.observe('search_time', 0.1, expression=expression)
+        self.assertEqual(
+            registry.get('search_time', expression=metrics.OTHER).count, 2)
+        self.assertEqual(
+            registry.get('search_time', expression='a').count, 1)
+
+    def test_snapshot(self):
+        self.registry.increment('errors', exception='ParseError')
+        self.registry.observe('parse_time', 0.5)
+        snapshot = self.registry.snapshot()
+        self.assertEqual(
+            [(m['name'], m['type'], m['labels']) for m in snapshot],
+            [('errors', 'counter', {'exception': 'ParseError'}),
+             ('parse_time', 'histogram', {})])
+        self.assertEqual(snapshot[0]['value'], 1)
+        self.assertEqual(snapshot[1]['count'], 1)
+
+    def test_exporters(self):
+        exported = []
+        exporter = lambda *args: exported.append(args)
+        self.registry.add_exporter(exporter)
+        self.registry.increment('errors', exception='ParseError')
+        self.registry.observe('parse_time', 0.5)
+        self.registry.remove_exporter(exporter)
+        self.registry.increment('cache_hits')
+        self.assertEqual(exported, [
+            ('errors', {'exception': 'ParseError'}, 1),
+            ('parse_time', {}, 0.5),
+        ])
+
+    def test_reset(self):
+        self.registry.increment('hits')
+        self.registry.reset()
+        self.assertEqual(self.registry.snapshot(), [])
+
+
+class TestRecordedMetrics(unittest.TestCase):
+    def setUp(self):
+        parser.Parser.purge()
+        self.registry = metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        parser.Parser.purge()
+
+    def test_disabled_by_default(self):
+        metrics.disable()
+        self.assertIsNone(metrics.get_registry())
+        jmespath.search('foo', {'foo': 1})
+        self.assertEqual(self.registry.snapshot(), [])
+
+    def test_enable_returns_active_registry(self):
+        self.assertIs(metrics.get_registry(), self.registry)
+        registry = metrics.MetricsRegistry()
+        self.assertIs(metrics.enable(registry), registry)
+        self.assertIs(metrics.get_registry(), registry)
+
+    def test_cache_hits_and_misses(self):
+        jmespath.compile('foo.bar')
+        jmespath.compile('foo.bar')
+        jmespath.compile('foo.baz')
+        self.assertEqual(self.registry.get('cache_hits').value, 1)
+        self.assertEqual(self.registry.get('cache_misses').value, 2)
+        self.assertEqual(self.registry.get('parse_time').count, 2)
+
+    def test_canonical_cache_hits(self):
+        jmespath.compile('foo.bar')
+        jmespath.compile('"foo".bar')
+        jmespath.compile('foo . bar')
+        self.assertEqual(self.registry.get('canonical_cache_hits').value, 2)
+        self.assertEqual(self.registry.get('cache_misses').value, 1)
+        self.assertEqual(self.registry.get('parse_time').count, 1)
+
+    def test_cache_evictions(self):
+        p = parser.Parser()
+        for i in range(p._MAX_SIZE + 1):
+            p.parse('foo[%s]' % i)
+        # The expression, canonical and AST caches are all full.
+        self.assertEqual(self.registry.get('cache_evictions').value,
+                         3 * (p._MAX_SIZE // 2))
+
+    def test_canonical_cache_hits_only_fill_expression_cache(self):
+        p = parser.Parser()
+        for i in range(p._MAX_SIZE // 2):
+            p.parse('foo[%s]' % i)
+            p.parse('"foo"[%s]' % i)
+        self.assertIsNone(self.registry.get('cache_evictions'))
+        p.parse('foo[-1]')
+        self.assertEqual(self.registry.get('cache_evictions').value,
+                         p._MAX_SIZE // 2)
+
+    def test_search_metrics(self):
+        expression = jmespath.compile('foo[*].bar')
+        expression.search({'foo': [{'bar': 1}, {'bar': 2}]})
+        expression.search({'foo': [{'bar': 1}]})
+        self.assertEqual(
+            self.registry.get('search_time', expression='foo[*].bar').count,
+            2)
+        self.assertEqual(self.registry.get('compile_time').count, 1)
+        self.assertEqual(self.registry.get('result_size').sum, 3)
+
+    def test_errors_by_exception_class(self):
+        with self.assertRaises(exceptions.ParseError):
+            jmespath.compile('foo.')
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('abs(foo)', {'foo': 'a'})
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('abs(foo)', {'foo': 'b'})
+        self.assertEqual(
+            self.registry.get('errors', exception='ParseError').value, 1)
+        self.assertEqual(
+            self.registry.get('errors', exception='JMESPathTypeError').value,
+            2)
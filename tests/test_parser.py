@@ -1,5 +1,6 @@
 #!/usr/bin/env python
 import re
+import pickle
 import random
 import string
 import threading
@@ -106,6 +107,30 @@ class TestParser(unittest.TestCase):
              'type': 'function_expression',
              'value': 'f'})
 
+    def test_let_expression(self):
+        self.assert_parsed_ast(
+            'let $a = foo, $b = bar in $a',
+            ast.let_expression(
+                [ast.variable_binding('a', ast.field('foo')),
+                 ast.variable_binding('b', ast.field('bar'))],
+                ast.variable_ref('a')))
+
+    def test_let_body_extends_over_pipes(self):
+        parsed = self.parser.parse('let $a = foo in $a | bar')
+        self.assertEqual(parsed.parsed['children'][-1]['type'], 'pipe')
+
+    def test_let_is_a_field_without_bindings(self):
+        self.assert_parsed_ast('let', ast.field('let'))
+        self.assert_parsed_ast('let.in',
+                               ast.subexpression([ast.field('let'),
+                                                  ast.field('in')]))
+
+    def test_let_requires_in(self):
+        with self.assertRaises(exceptions.ParseError):
+            self.parser.parse('let $a = foo $a')
+        with self.assertRaises(exceptions.IncompleteExpressionError):
+            self.parser.parse('let $a = foo')
+
 
 class TestErrorMessages(unittest.TestCase):
 
@@ -349,6 +374,62 @@ class TestParserCaching(unittest.TestCase):
         self.assertEqual(errors, [])
 
 
+class TestCanonicalCaching(unittest.TestCase):
+    def setUp(self):
+        self.parser = parser.Parser()
+        self.parser.purge()
+
+    def tearDown(self):
+        self.parser.purge()
+
+    def assert_shares_ast(self, first, second):
+        first = self.parser.parse(first)
+        second = self.parser.parse(second)
+        self.assertIs(first.parsed, second.parsed)
+        self.assertIs(first._compiled, second._compiled)
+
+    def test_whitespace_variants_share_ast(self):
+        self.assert_shares_ast('foo.bar', ' foo . bar  ')
+
+    def test_quoted_identifiers_share_ast(self):
+        self.assert_shares_ast('foo.bar', '"foo".bar')
+
+    def test_redundant_parens_share_ast(self):
+        self.assert_shares_ast('foo.bar || baz', '((foo.bar) || (baz))')
+
+    def test_literal_variants_share_ast(self):
+        self.assert_shares_ast("foo == 'a'", 'foo == `"a"`')
+
+    def test_equivalent_expressions_keep_their_expression(self):
+        self.parser.parse('foo.bar')
+        self.assertEqual(self.parser.parse('"foo".bar').expression,
+                         '"foo".bar')
+
+    def test_different_literal_types_are_not_shared(self):
+        first = self.parser.parse('foo == `1`')
+        second = self.parser.parse('foo == `1.0`')
+        third = self.parser.parse('foo == `true`')
+        self.assertIsNot(first.parsed, second.parsed)
+        self.assertIsNot(first.parsed, third.parsed)
+        self.assertIs(second.parsed['children'][1]['value'].__class__,
+                      float)
+
+    def test_quoted_function_name_is_still_an_error(self):
+        self.parser.parse('foo(@)')
+        with self.assertRaises(exceptions.ParseError):
+            self.parser.parse('"foo"(@)')
+
+    def test_quoted_keyword_is_not_a_keyword(self):
+        self.parser.parse('let $a = b in $a')
+        with self.assertRaises(exceptions.ParseError):
+            self.parser.parse('"let" $a = b in $a')
+
+    def test_subtrees_are_shared_across_expressions(self):
+        first = self.parser.parse('foo.bar[0]')
+        second = self.parser.parse('length(foo.bar[0])')
+        self.assertIs(second.parsed['children'][0], first.parsed)
+
+
 class TestParserAddsExpressionAttribute(unittest.TestCase):
     def test_expression_available_from_parser(self):
         p = parser.Parser()
@@ -390,5 +471,105 @@ class TestRenderGraphvizFile(unittest.TestCase):
             'field3 [label="field(bar)"]\n}')
 
 
+class TestPickling(unittest.TestCase):
+    def setUp(self):
+        parser.Parser.purge()
+
+    def round_trip(self, parsed):
+        data = pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)
+        parser.Parser.purge()
+        return pickle.loads(data)
+
+    def test_ast_round_trips(self):
+        expressions = [
+            'foo.bar[0]',
+            'foo[1:-1:2].bar',
+            'foo[?a > `1` && !b].{x: x, y: `[1, {"z": null}]`}',
+            "let $a = 'x' in sort_by(foo, &bar)[*].[$a, baz]",
+            '*.foo[].bar | @',
+        ]
+        for expression in expressions:
+            parsed = parser.Parser().parse(expression)
+            loaded = self.round_trip(parsed)
+            self.assertIs(type(loaded), parser.ParsedResult)
+            self.assertEqual(loaded.expression, expression)
+            self.assertEqual(loaded.parsed, parsed.parsed)
+
+    def test_compiled_lazily_after_loading(self):
+        parsed = parser.Parser().parse('foo[?a > `1`].b')
+        data = {'foo': [{'a': 1, 'b': 'x'}, {'a': 2, 'b': 'y'}]}
+        self.assertEqual(parsed.search(data), ['y'])
+        loaded = self.round_trip(parsed)
+        self.assertEqual(loaded._compiled, {})
+        self.assertEqual(loaded.search(data), ['y'])
+
+    def test_shares_cached_expression(self):
+        parsed = parser.Parser().parse('foo.bar')
+        parsed.search({})
+        loaded = pickle.loads(pickle.dumps(parsed))
+        self.assertIs(loaded.parsed, parsed.parsed)
+        self.assertIs(loaded._compiled, parsed._compiled)
+
+    def test_prepared_expression(self):
+        parsed = parser.Parser().parse('foo[?a == $x].b')
+        prepared = parser.PreparedExpression(parsed.expression, parsed.parsed)
+        loaded = self.round_trip(prepared)
+        self.assertIs(type(loaded), parser.PreparedExpression)
+        self.assertEqual(loaded.parameters, frozenset(['x']))
+        self.assertEqual(
+            loaded.search({'foo': [{'a': 1, 'b': 2}]}, params={'x': 1}), [2])
+
+    def test_smaller_than_pickled_ast(self):
+        parsed = parser.Parser().parse('foo[?a > `1`].{x: x, y: y.z[0]}')
+        self.assertLess(
+            len(pickle.dumps(parsed, pickle.HIGHEST_PROTOCOL)),
+            len(pickle.dumps((parsed.expression, parsed.parsed),
+                             pickle.HIGHEST_PROTOCOL)))
+
+    def test_unsupported_version(self):
+        parsed = parser.Parser().parse('foo')
+        function, args = parsed.__reduce__()
+        args = (args[0], args[1] + 1) + args[2:]
+        with self.assertRaises(ValueError):
+            function(*args)
+
+    def test_invalid_ast(self):
+        version = parser._SERIALIZATION_VERSION
+        invalid = [
+            ('unknown', ()),
+            ('field', [], 'foo'),
+            ('field',),
+            ('subexpression', (('field', (), 'a'), 'b')),
+            ('slice', (None, 'a', None)),
+            ('slice', (None, True, None)),
+            ('slice', (None, None)),
+            ('subexpression', ()),
+            ('subexpression', (('field', (), 'a'),)),
+            ('index', (), 'x'),
+            ('index', (), True),
+            ('index', ()),
+            ('literal', ()),
+            ('field', (), 1),
+            ('identity', (), None),
+            ('comparator', (('field', (), 'a'), ('field', (), 'b')),
+             'bogus'),
+            ('comparator', (('field', (), 'a'),), 'eq'),
+            ('multi_select_dict', (('field', (), 'a'),)),
+            ('multi_select_list', ()),
+            ('let_expression', (('field', (), 'a'), ('field', (), 'b'))),
+        ]
+        for serialized in invalid:
+            with self.assertRaises(ValueError):
+                parser._load_parsed_result(
+                    parser.ParsedResult, version, 'foo', serialized)
+
+    def test_invalid_ast_of_cached_expression(self):
+        parser.Parser().parse('foo')
+        with self.assertRaises(ValueError):
+            parser._load_parsed_result(
+                parser.ParsedResult, parser._SERIALIZATION_VERSION, 'foo',
+                ('field', (), 1))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,164 @@
+from tests import unittest
+
+import jmespath
+from jmespath import exceptions
+from jmespath import metrics
+from jmespath import profiler
+from jmespath import visitor
+
+
+class TestProfile(unittest.TestCase):
+    def setUp(self):
+        self.data = {'foo': [{'a': i, 'b': i * 10} for i in range(10)]}
+
+    def stats_for(self, profile, node_type):
+        return [stats for _, stats in profile.nodes
+                if stats.node['type'] == node_type]
+
+    def test_profile_returns_search_result(self):
+        expression = jmespath.compile('foo[?a > `6`].b')
+        profile = expression.profile(self.data)
+        self.assertEqual(profile.result, expression.search(self.data))
+        self.assertEqual(profile.expression, 'foo[?a > `6`].b')
+
+    def test_counts_visits(self):
+        profile = jmespath.compile('foo[*].a').profile(self.data)
+        field_a = [stats for stats in self.stats_for(profile, 'field')
+                   if stats.node['value'] == 'a']
+        self.assertEqual(field_a[0].visits, 10)
+
+    def test_counts_elements_through_filters(self):
+        profile = jmespath.compile('foo[?a > `6`].b').profile(self.data)
+        stats = self.stats_for(profile, 'filter_projection')[0]
+        self.assertEqual(stats.elements_in, 10)
+        self.assertEqual(stats.elements_out, 3)
+
+    def test_counts_elements_through_value_projections(self):
+        profile = jmespath.compile('*.a').profile(
+            {'x': {'a': 1}, 'y': {'a': 2}, 'z': {}})
+        stats = self.stats_for(profile, 'value_projection')[0]
+        self.assertEqual(stats.elements_in, 3)
+        self.assertEqual(stats.elements_out, 2)
+
+    def test_self_time_excludes_children(self):
+        profile = jmespath.compile('foo[*].a').profile(self.data)
+        root = profile.nodes[0][1]
+        self.assertEqual(profile.total_time, root.total_time)
+        self.assertLessEqual(root.self_time, root.total_time)
+        self.assertAlmostEqual(
+            sum(stats.self_time for _, stats in profile.nodes),
+            root.total_time)
+
+    def test_unevaluated_nodes_are_reported(self):
+        profile = jmespath.compile('foo || bar').profile({'foo': 1})
+        fields = self.stats_for(profile, 'field')
+        self.assertEqual([stats.visits for stats in fields], [1, 0])
+
+    def test_to_list(self):
+        profile = jmespath.compile('foo[*].a').profile(self.data)
+        nodes = profile.to_list()
+        self.assertEqual(
+            [(node['depth'], node['type'], node['value'])
+             for node in nodes],
+            [(0, 'projection', None), (1, 'field', 'foo'),
+             (1, 'field', 'a')])
+        self.assertEqual(nodes[0]['elements_out'], 10)
+
+    def test_render_tree(self):
+        profile = jmespath.compile('foo[:2].a').profile(self.data)
+        lines = profile.render_tree().splitlines()
+        self.assertTrue(lines[0].startswith('projection()  visits=1'))
+        self.assertIn('in=2 out=2', lines[0])
+        self.assertTrue(lines[3].startswith('    slice(:2:)  visits=1'))
+
+    def test_render_dot(self):
+        expression = jmespath.compile('foo[:2].a')
+        profile = expression.profile(self.data)
+        contents = expression._render_dot_file(profile)
+        self.assertTrue(contents.startswith('digraph AST {'))
+        self.assertIn('visits=1', contents)
+        self.assertIn('fillcolor="#ff', contents)
+
+    def test_trace_memory(self):
+        profile = jmespath.compile('foo[*].{a: a, b: b}').profile(
+            self.data, trace_memory=True)
+        self.assertGreater(profile.nodes[0][1].memory, 0)
+
+    def test_memory_not_traced_by_default(self):
+        profile = jmespath.compile('foo[*].{a: a, b: b}').profile(self.data)
+        self.assertEqual(profile.nodes[0][1].memory, 0)
+
+    def test_profile_with_params(self):
+        expression = jmespath.prepare('foo[?a == $1].b')
+        profile = expression.profile(self.data, params=[3])
+        self.assertEqual(profile.result, [30])
+        with self.assertRaises(exceptions.UndefinedVariableError):
+            expression.profile(self.data)
+
+
+class TestProfilingInterpreter(unittest.TestCase):
+    def test_is_a_tree_interpreter(self):
+        interpreter = profiler.ProfilingInterpreter()
+        self.assertIsInstance(interpreter, visitor.TreeInterpreter)
+        parsed = jmespath.compile('a.b').parsed
+        self.assertEqual(interpreter.visit(parsed, {'a': {'b': 1}}), 1)
+        self.assertEqual(len(interpreter.stats), 3)
+
+
+class TestSlowSearches(unittest.TestCase):
+    def setUp(self):
+        self.slow = []
+        self.data = {'foo': [{'a': i} for i in range(5)], 'bar': 1}
+
+    def options(self, **kwargs):
+        return jmespath.Options(on_slow=self.slow.append, **kwargs)
+
+    def test_reports_searches_over_threshold(self):
+        result = jmespath.search('foo[*].a', self.data,
+                                 self.options(slow_threshold_ms=0))
+        self.assertEqual(result, [0, 1, 2, 3, 4])
+        self.assertEqual(len(self.slow), 1)
+        slow = self.slow[0]
+        self.assertIsInstance(slow, profiler.SlowSearch)
+        self.assertEqual(slow.expression, 'foo[*].a')
+        self.assertGreaterEqual(slow.elapsed_ms, 0)
+        self.assertEqual(slow.threshold_ms, 0)
+        self.assertEqual(slow.input_type, 'dict')
+        self.assertEqual(slow.input_size, 2)
+        self.assertEqual(slow.result_size, 5)
+        self.assertIsNone(slow.profile)
+
+    def test_fast_searches_are_not_reported(self):
+        jmespath.search('foo', self.data,
+                        self.options(slow_threshold_ms=60000))
+        self.assertEqual(self.slow, [])
+
+    def test_requires_threshold(self):
+        jmespath.search('foo', self.data, self.options())
+        self.assertEqual(self.slow, [])
+
+    def test_failed_searches_are_not_reported(self):
+        with self.assertRaises(exceptions.JMESPathTypeError):
+            jmespath.search('abs(foo)', self.data,
+                            self.options(slow_threshold_ms=0))
+        self.assertEqual(self.slow, [])
+
+    def test_profile_slow(self):
+        jmespath.search('foo[?a > `2`].a', self.data,
+                        self.options(slow_threshold_ms=0, profile_slow=True,
+                                     deadline=60))
+        profile = self.slow[0].profile
+        self.assertEqual(profile.result, [3, 4])
+        self.assertEqual(profile.nodes[0][1].elements_out, 2)
+        self.assertEqual(self.slow[0].to_dict()['profile'],
+                         profile.to_list())
+
+    def test_reported_with_metrics_enabled(self):
+        metrics.enable()
+        try:
+            jmespath.search('bar', self.data,
+                            self.options(slow_threshold_ms=0))
+        finally:
+            metrics.disable()
+        self.assertEqual(len(self.slow), 1)
+        self.assertIsNone(self.slow[0].result_size)
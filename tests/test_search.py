@@ -45,6 +45,132 @@ class TestSearchOptions(unittest.TestCase):
         )
 
 
+    def test_can_disable_type_validation(self):
+        options = jmespath.Options(validate_types=False)
+        self.assertEqual(
+            jmespath.search('sum(@)', [1, 2, 3], options=options), 6)
+        # Type errors are no longer detected, the function is
+        # called directly with whatever value it's given.
+        self.assertEqual(
+            jmespath.search('length(@)', 'abc', options=options), 3)
+        with self.assertRaises(TypeError):
+            jmespath.search('abs(@)', 'abc', options=options)
+
+    def test_arity_is_validated_without_type_validation(self):
+        options = jmespath.Options(validate_types=False)
+        with self.assertRaises(jmespath.exceptions.ArityError):
+            jmespath.search('abs(@, @)', 1, options=options)
+
+    def test_sampled_type_validation(self):
+        options = jmespath.Options(validate_types=False,
+                                   validation_sample_rate=1.0)
+        with self.assertRaises(jmespath.exceptions.JMESPathTypeError):
+            jmespath.search('sum(@)', [1, 'a'], options=options)
+
+
+class TestLetExpressions(unittest.TestCase):
+    def test_variables_are_bound_in_body(self):
+        data = {'items': [{'price': 1}, {'price': 5}, {'price': 6}]}
+        self.assertEqual(
+            jmespath.search(
+                'let $avg = avg(items[*].price) in '
+                'items[?price > $avg].price', data),
+            [5, 6])
+
+    def test_bindings_are_evaluated_in_enclosing_scope(self):
+        with self.assertRaises(jmespath.exceptions.UndefinedVariableError):
+            jmespath.search('let $a = `1`, $b = $a in $b', {})
+
+    def test_inner_scope_shadows_outer_scope(self):
+        self.assertEqual(
+            jmespath.search('let $a = a in [let $a = b in $a, $a]',
+                            {'a': 'A', 'b': 'B'}),
+            ['B', 'A'])
+
+    def test_variables_are_visible_in_exprefs(self):
+        self.assertEqual(
+            jmespath.search('let $k = offset in map(&sum([a, $k]), items)',
+                            {'offset': 10, 'items': [{'a': 2}, {'a': 1}]}),
+            [12, 11])
+
+    def test_undefined_variable(self):
+        with self.assertRaises(jmespath.exceptions.UndefinedVariableError):
+            jmespath.search('$foo', {})
+
+    def test_variables_do_not_leak_out_of_scope(self):
+        with self.assertRaises(jmespath.exceptions.UndefinedVariableError):
+            jmespath.search('[let $a = a in $a, $a]', {'a': 1})
+
+
+class TestParameters(unittest.TestCase):
+    def setUp(self):
+        self.data = {'items': [{'id': 'a', 'n': 1}, {'id': 'b', 'n': 2}]}
+
+    def test_can_search_with_named_params(self):
+        self.assertEqual(
+            jmespath.search('items[?id == $id].n', self.data,
+                            params={'id': 'b'}),
+            [2])
+
+    def test_can_search_with_positional_params(self):
+        self.assertEqual(
+            jmespath.search('items[?id == $1 || n == $2].id', self.data,
+                            params=['a', 2]),
+            ['a', 'b'])
+
+    def test_params_are_not_parsed_as_expressions(self):
+        self.assertEqual(
+            jmespath.search('items[?id == $id].n', self.data,
+                            params={'id': "a' || id != 'a"}),
+            [])
+
+    def test_prepared_expression(self):
+        prepared = jmespath.prepare(
+            'let $limit = `1` in items[?id == $id && n > $limit].n')
+        self.assertEqual(prepared.parameters, frozenset(['id']))
+        self.assertEqual(prepared.search(self.data, params={'id': 'b'}), [2])
+        self.assertEqual(prepared.search(self.data, params={'id': 'a'}), [])
+
+    def test_prepared_expression_requires_all_params(self):
+        prepared = jmespath.prepare('items[?id == $id] || $default')
+        with self.assertRaises(jmespath.exceptions.UndefinedVariableError):
+            prepared.search(self.data, params={'id': 'b'})
+
+
+class TestLimits(unittest.TestCase):
+    def setUp(self):
+        self.data = [[list(range(10)) for i in range(10)] for j in range(10)]
+
+    def test_max_steps(self):
+        options = jmespath.Options(max_steps=100)
+        self.assertEqual(
+            jmespath.search('[0][*]', self.data, options), self.data[0])
+        with self.assertRaises(jmespath.exceptions.LimitExceededError) as e:
+            jmespath.search('[*][*][*]', self.data, options)
+        self.assertEqual(e.exception.limit_name, 'max_steps')
+
+    def test_max_steps_includes_function_arguments(self):
+        options = jmespath.Options(max_steps=5)
+        with self.assertRaises(jmespath.exceptions.LimitExceededError):
+            jmespath.search('sort(@)', list(range(10)), options)
+
+    def test_max_output_elements(self):
+        options = jmespath.Options(max_output_elements=50)
+        with self.assertRaises(jmespath.exceptions.LimitExceededError) as e:
+            jmespath.search('[][]', self.data, options)
+        self.assertEqual(e.exception.limit_name, 'max_output_elements')
+
+    def test_deadline(self):
+        options = jmespath.Options(deadline=0)
+        with self.assertRaises(jmespath.exceptions.LimitExceededError) as e:
+            jmespath.search('[*][*]', self.data, options)
+        self.assertEqual(str(e.exception),
+                         'Evaluation exceeded the deadline limit of 0')
+
+    def test_limit_errors_are_jmespath_errors(self):
+        self.assertTrue(issubclass(jmespath.exceptions.LimitExceededError,
+                                   jmespath.exceptions.JMESPathError))
+
 
 class TestPythonSpecificCases(unittest.TestCase):
     def test_can_compare_strings(self):